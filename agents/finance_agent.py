@@ -2,6 +2,7 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from ai_service import get_llm
 from graph.state import AgentState
 from rag.vectorstore import VectorStoreManager
+from rag.working_set import working_set
 from tools.finance_tool import validate_reimbursement
 from config import DATA_DIR
 import os
@@ -24,8 +25,9 @@ class FinanceAgent:
         llm = get_llm(node_type="domain_agent", config=config)
         query = state.get("current_task") or state['messages'][-1].content
         
-        # RAG Step
-        docs = self.vector_store.search(query)
+        # RAG Step (reuses this thread's working set on follow-ups, else the speculative prefetch or a search)
+        domain = self.vector_store.domain
+        docs, retrieved = working_set.retrieve(self.vector_store, query, state.get("retrieval", {}).get(domain))
         context = "\n\n".join([d.page_content for d in docs])
         
         # Check for reimbursement validation trigger
@@ -52,5 +54,6 @@ class FinanceAgent:
 
         return {
             "response": final_response,
+            "retrieval": {domain: retrieved},
             "all_responses": [f"Finance: {final_response}"]
         }
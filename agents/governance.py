@@ -17,7 +17,8 @@ class GovernanceAgent:
         """
         config = state.get("config_override", {})
         llm = get_llm(node_type="privacy", config=config)
-        last_message = state['messages'][-1].content
+        original = state['messages'][-1]
+        last_message = original.content
         
         prompt = f"""
         Act as a PII Redactor for an enterprise service desk.
@@ -34,9 +35,10 @@ class GovernanceAgent:
         
         print(f"[NODE] Privacy Shield: Scanned and processed query.")
         
-        # We replace the content of the message in the graph flow
+        # We replace the content of the message in the graph flow.
+        # The copy is tagged with the original's id so compaction can drop the unredacted text.
         redacted_content = response.content.strip()
         
         return {
-            "messages": [HumanMessage(content=redacted_content)]
+            "messages": [HumanMessage(content=redacted_content, additional_kwargs={"redacted_from": original.id})]
         }
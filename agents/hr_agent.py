@@ -2,6 +2,7 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from ai_service import get_llm
 from graph.state import AgentState
 from rag.vectorstore import VectorStoreManager
+from rag.working_set import working_set
 from config import DATA_DIR
 import os
 
@@ -23,8 +24,9 @@ class HRAgent:
         # Multi-intent check: if we are in a subtask, use that as query
         query = state.get("current_task") or state['messages'][-1].content
         
-        # RAG Step
-        docs = self.vector_store.search(query)
+        # RAG Step (reuses this thread's working set on follow-ups, else the speculative prefetch or a search)
+        domain = self.vector_store.domain
+        docs, retrieved = working_set.retrieve(self.vector_store, query, state.get("retrieval", {}).get(domain))
         context = "\n\n".join([d.page_content for d in docs])
         
         prompt = f"""
@@ -43,5 +45,6 @@ class HRAgent:
         
         return {
             "response": response.content,
+            "retrieval": {domain: retrieved},
             "all_responses": [f"HR: {response.content}"]
         }
@@ -1,57 +1,166 @@
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ensure_config
 from ai_service import get_llm
 from graph.state import AgentState
 from rag.vectorstore import VectorStoreManager
-from tools.ticket_tool import create_ticket
-from config import DATA_DIR
+from rag.working_set import working_set
+from tools.ticket_tool import ticket_connector
+from tools.ticket_index import open_tickets
+from tracing import tracer
+from config import DATA_DIR, TICKET_DEDUP_ENABLED
+from typing import Optional
+import asyncio
 import os
 
 class ITAgent:
     """
     Handles IT support queries. Can create tickets if troubleshooting fails.
+    Exposes both execute (sync graphs) and aexecute (async graphs) so the ticketing
+    round trip never blocks the event loop serving other requests.
     """
     def __init__(self):
         self.vector_store = VectorStoreManager("IT", os.path.join(DATA_DIR, "it_docs"))
 
-    def execute(self, state: AgentState) -> dict:
+    def _prepare(self, state: AgentState):
         """
-        Retrieves IT docs and attempts to solve or escalate via ticket.
-        @param state - Current graph state
-        @returns Updated state with IT response and potential ticket ID
+        Resolves the LLM, query and prompt (including the RAG step) for this turn.
+        @returns (llm, query, messages, working-set entry for state["retrieval"])
         """
         config = state.get("config_override", {})
         llm = get_llm(node_type="domain_agent", config=config)
         query = state.get("current_task") or state['messages'][-1].content
-        
-        # RAG Step
-        docs = self.vector_store.search(query)
+
+        # RAG Step (reuses this thread's working set on follow-ups, else the speculative prefetch or a search)
+        domain = self.vector_store.domain
+        docs, retrieved = working_set.retrieve(self.vector_store, query, state.get("retrieval", {}).get(domain))
         context = "\n\n".join([d.page_content for d in docs])
-        
+
         prompt = f"""
         You are an IT Support Agent. Use the context to solve the user's technical issue.
         If a ticket needs to be created, state clearly: "I will create a ticket for you."
-        
+
         Context:
         {context}
-        
+
         User Query: {query}
         """
-        
-        response = llm.invoke([SystemMessage(content="You are helpful IT agent."), HumanMessage(content=prompt)])
-        
+        messages = [SystemMessage(content="You are helpful IT agent."), HumanMessage(content=prompt)]
+        return llm, query, messages, {domain: retrieved}
+
+    @staticmethod
+    def _thread_id(config: Optional[RunnableConfig]) -> Optional[str]:
+        # Planner-dispatched calls get no config argument; fall back to the ambient run config
+        return (config or ensure_config()).get("configurable", {}).get("thread_id")
+
+    def _finish(self, state: AgentState, retrieval: dict, content: str, ticket_data: Optional[dict], linked_users: int = 0) -> dict:
         ticket_id = state.get("ticket_id")
-        if "create a ticket" in response.content.lower():
-            # Tool call (manual simulation for this node)
-            ticket_data = create_ticket.invoke(query)
+        if ticket_data and linked_users:
+            ticket_id = ticket_data["id"]
+            response_text = f"{content}\n\n[🔗 Linked to Existing Ticket]\nID: {ticket_id}\nPriority: {ticket_data['priority']}\nAffected Users: {linked_users}"
+        elif ticket_data:
             ticket_id = ticket_data["id"]
-            response_text = f"{response.content}\n\n[🎫 Ticket Created]\nID: {ticket_id}\nPriority: {ticket_data['priority']}\nEndpoint: {ticket_data['cluster_node']}"
+            response_text = f"{content}\n\n[🎫 Ticket Created]\nID: {ticket_id}\nPriority: {ticket_data['priority']}\nEndpoint: {ticket_data['cluster_node']}"
         else:
-            response_text = response.content
+            response_text = content
 
         print(f"[NODE] IT Agent generated response and ticket: {ticket_id}")
-        
+
         return {
             "response": response_text,
             "ticket_id": ticket_id,
+            "retrieval": retrieval,
             "all_responses": [f"IT: {response_text}"]
         }
+
+    def _ticket_failed(self, state: AgentState, retrieval: dict, content: str, reservation, error: Exception) -> dict:
+        """
+        A ticketing outage must not cost the user the answer: release the dedup reservation
+        and return the response with a note instead of failing the graph run.
+        The thread keeps the ticket_id of an earlier turn, if any.
+        """
+        print(f"[RECOVER] Ticket creation failed: {error}")
+        if reservation:
+            open_tickets.release(reservation)
+        return self._finish(state, retrieval, f"{content}\n\n[⚠️ Ticket could not be created]\nThe ticketing system is unavailable; please try again later.", None)
+
+    def _claim_ticket(self, query: str, thread_id: Optional[str]):
+        """
+        Checks the open-ticket index before a create.
+        @returns (reservation, existing ticket, linked users); reservation is set only when
+                 the caller must create the ticket and publish it back to the index
+        """
+        if not TICKET_DEDUP_ENABLED:
+            return None, None, 0
+        try:
+            entry, is_new = open_tickets.claim(open_tickets.embed(query), query, thread_id)
+        except Exception as e:
+            print(f"[RECOVER] Ticket dedup unavailable: {e}")
+            return None, None, 0
+        if is_new:
+            return entry, None, 0
+        ticket = open_tickets.wait(entry)
+        if ticket:
+            print(f"[NODE] IT Agent attached {thread_id} to open ticket {ticket['id']}")
+        # A failed original reservation falls back to a normal (unindexed) create
+        return None, ticket, open_tickets.affected_users(entry)
+
+    def execute(self, state: AgentState, config: Optional[RunnableConfig] = None) -> dict:
+        """
+        Retrieves IT docs and attempts to solve or escalate via ticket.
+        @param state - Current graph state
+        @param config - Run config (thread_id feeds the ticket idempotency key)
+        @returns Updated state with IT response and potential ticket ID
+        """
+        llm, query, messages, retrieval = self._prepare(state)
+        response = llm.invoke(messages)
+
+        if "create a ticket" not in response.content.lower():
+            return self._finish(state, retrieval, response.content, None)
+
+        thread_id = self._thread_id(config)
+        reservation, existing, linked_users = self._claim_ticket(query, thread_id)
+        if existing:
+            return self._finish(state, retrieval, response.content, existing, linked_users)
+        try:
+            with tracer.span("tool.create_ticket", kind="client"):
+                ticket_data = ticket_connector.create(query, thread_id=thread_id)
+        except Exception as e:
+            return self._ticket_failed(state, retrieval, response.content, reservation, e)
+        except BaseException:
+            # Cancelled (client disconnect, lost job lease): free the slot so similar requests do not wait on it
+            if reservation:
+                open_tickets.release(reservation)
+            raise
+        if reservation:
+            open_tickets.complete(reservation, ticket_data)
+        return self._finish(state, retrieval, response.content, ticket_data)
+
+    async def aexecute(self, state: AgentState, config: Optional[RunnableConfig] = None) -> dict:
+        """
+        Async variant of execute used when the graph runs under ainvoke/astream_events.
+        """
+        # Retrieval and the dedup lookup are blocking work; keep them off the event loop
+        llm, query, messages, retrieval = await asyncio.to_thread(self._prepare, state)
+        response = await llm.ainvoke(messages)
+
+        if "create a ticket" not in response.content.lower():
+            return self._finish(state, retrieval, response.content, None)
+
+        thread_id = self._thread_id(config)
+        reservation, existing, linked_users = await asyncio.to_thread(self._claim_ticket, query, thread_id)
+        if existing:
+            return self._finish(state, retrieval, response.content, existing, linked_users)
+        try:
+            with tracer.span("tool.create_ticket", kind="client"):
+                ticket_data = await ticket_connector.acreate(query, thread_id=thread_id)
+        except Exception as e:
+            return self._ticket_failed(state, retrieval, response.content, reservation, e)
+        except BaseException:
+            # Cancelled (client disconnect, lost job lease): free the slot so similar requests do not wait on it
+            if reservation:
+                open_tickets.release(reservation)
+            raise
+        if reservation:
+            open_tickets.complete(reservation, ticket_data)
+        return self._finish(state, retrieval, response.content, ticket_data)
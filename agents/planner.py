@@ -1,26 +1,105 @@
+import asyncio
 import json
+from typing import Dict, List, Optional
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor, patch_config
 from ai_service import get_llm
 from graph.state import AgentState
+from config import PLANNER_STREAMING, PLANNER_MAX_PARALLEL
 
-class PlannerAgent:
+VALID_AGENTS = {"hr": "HR", "it": "IT", "finance": "Finance"}
+
+class IncrementalTaskParser:
     """
-    Handles complex, multi-intent queries by decomposing them into sequential tasks.
-    Enables the orchestrator to handle queries like "My laptop is broken and I need leave info".
+    Incrementally parses a streamed JSON array of {"agent", "task"} objects.
+    Each object is emitted as soon as its closing brace arrives, so callers can act on it
+    while the rest of the array is still being generated. Code fences, prose around the
+    array and malformed tail output are ignored instead of failing the whole plan.
     """
     def __init__(self):
-        pass
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._obj_start = None
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self.finished = False
 
-    def plan(self, state: AgentState) -> dict:
+    def feed(self, chunk: str) -> List[dict]:
         """
-        Splits the user query into a list of specific sub-tasks with assigned agents.
-        @param state - Current graph state
-        @returns List of tasks for sequential execution
+        Consumes the next chunk of model output.
+        @param chunk - Raw text delta from the LLM stream
+        @returns Tasks completed by this chunk (possibly empty)
         """
-        config = state.get("config_override", {})
-        llm = get_llm(node_type="planner", config=config)
-        query = state['messages'][-1].content
-        
+        if self.finished or not chunk:
+            return []
+        self._buffer += chunk
+        tasks = []
+
+        while self._pos < len(self._buffer):
+            ch = self._buffer[self._pos]
+            if not self._started:
+                self._started = ch == "["
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._obj_start = self._pos
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    task = self._parse_task(self._buffer[self._obj_start:self._pos + 1])
+                    if task:
+                        tasks.append(task)
+                    self._obj_start = None
+            elif ch == "]" and self._depth == 0:
+                self.finished = True
+                break
+            self._pos += 1
+
+        # Drop consumed text between objects to keep the buffer small
+        if self._obj_start is None:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        return tasks
+
+    @staticmethod
+    def _parse_task(raw: str) -> Optional[dict]:
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            print(f"[RECOVER] Planner skipped malformed task: {raw[:80]}")
+            return None
+        if not isinstance(obj, dict):
+            return None
+        agent = VALID_AGENTS.get(str(obj.get("agent", "")).strip().lower())
+        task = obj.get("task")
+        if not agent or not isinstance(task, str) or not task.strip():
+            return None
+        return {"agent": agent, "task": task.strip()}
+
+class PlannerAgent:
+    """
+    Handles complex, multi-intent queries by decomposing them into sequential tasks.
+    Enables the orchestrator to handle queries like "My laptop is broken and I need leave info".
+    When domain executors are supplied, tasks are dispatched while the plan is still streaming.
+    Executors are the domain node runnables: each task runs as a child run named after its
+    node, so it streams the same agent_thought events and node spans as a routed turn.
+    """
+    def __init__(self, executors: Optional[Dict[str, Runnable]] = None):
+        self.executors = executors or {}
+
+    def _build_messages(self, query: str) -> list:
         prompt = f"""
         Break the following multi-intent user query into a list of tasks.
         Each task must specify the target agent: HR, IT, or Finance.
@@ -33,14 +112,39 @@ class PlannerAgent:
             {{"agent": "Finance", "task": "reimbursement procedure"}}
         ]
         """
-        
-        response = llm.invoke([SystemMessage(content="You are a task planner for a service desk."), HumanMessage(content=prompt)])
-        
+        return [SystemMessage(content="You are a task planner for a service desk."), HumanMessage(content=prompt)]
+
+    def plan(self, state: AgentState, config: Optional[RunnableConfig] = None) -> dict:
+        """
+        Splits the user query into a list of specific sub-tasks with assigned agents.
+        @param state - Current graph state
+        @param config - Run config of the planner node (parent of dispatched task runs)
+        @returns List of tasks for sequential execution, or the merged task results when streaming
+        """
+        llm = get_llm(node_type="planner", config=state.get("config_override", {}))
+        messages = self._build_messages(state['messages'][-1].content)
+
+        if PLANNER_STREAMING and self.executors:
+            return self._plan_and_dispatch(state, llm, messages, config)
+        return self._parse_plan(llm.invoke(messages))
+
+    async def aplan(self, state: AgentState, config: Optional[RunnableConfig] = None) -> dict:
+        """
+        Async plan(): tasks run as asyncio tasks (IT uses its async ticketing path).
+        """
+        llm = get_llm(node_type="planner", config=state.get("config_override", {}))
+        messages = self._build_messages(state['messages'][-1].content)
+
+        if PLANNER_STREAMING and self.executors:
+            return await self._aplan_and_dispatch(state, llm, messages, config)
+        return self._parse_plan(await llm.ainvoke(messages))
+
+    def _parse_plan(self, response) -> dict:
         try:
             content = response.content.replace("```json", "").replace("```", "").strip()
             tasks_list = json.loads(content)
             print(f"[NODE] Planner created {len(tasks_list)} tasks: {tasks_list}")
-            
+
             # We store tasks in state. The graph will consume them one by one.
             return {
                 "tasks": tasks_list,
@@ -50,3 +154,110 @@ class PlannerAgent:
         except Exception as e:
             print(f"[RECOVER] Planner failed: {e}")
             return {"tasks": [], "intent": "Unknown"}
+
+    def _plan_and_dispatch(self, state: AgentState, llm, messages: list, config: Optional[RunnableConfig]) -> dict:
+        """
+        Streams the plan through IncrementalTaskParser and submits every task to its
+        domain executor the moment it is parsed, overlapping execution with generation.
+        """
+        parser = IncrementalTaskParser()
+        tasks, futures = [], []
+
+        # ContextThreadPoolExecutor propagates callbacks so token streaming still reaches the API
+        with ContextThreadPoolExecutor(max_workers=max(1, PLANNER_MAX_PARALLEL)) as pool:
+            try:
+                for chunk in llm.stream(messages):
+                    content = chunk.content if isinstance(chunk.content, str) else ""
+                    for task in parser.feed(content):
+                        tasks.append(task)
+                        print(f"[NODE] Planner dispatched task {len(tasks)}: {task}")
+                        futures.append(pool.submit(self._run_task, state, task, config))
+                    if parser.finished:
+                        break
+            except Exception as e:
+                # Keep whatever was already dispatched; only the unparsed tail is lost
+                print(f"[RECOVER] Planner stream interrupted: {e}")
+
+            results = [f.result() for f in futures]
+        return self._merge(state, tasks, results)
+
+    async def _aplan_and_dispatch(self, state: AgentState, llm, messages: list, config: Optional[RunnableConfig]) -> dict:
+        """
+        Async _plan_and_dispatch(): at most PLANNER_MAX_PARALLEL tasks run at once.
+        """
+        parser = IncrementalTaskParser()
+        tasks, running = [], []
+        slots = asyncio.Semaphore(max(1, PLANNER_MAX_PARALLEL))
+
+        async def run(task: dict) -> dict:
+            async with slots:
+                return await self._arun_task(state, task, config)
+
+        try:
+            try:
+                async for chunk in llm.astream(messages):
+                    content = chunk.content if isinstance(chunk.content, str) else ""
+                    for task in parser.feed(content):
+                        tasks.append(task)
+                        print(f"[NODE] Planner dispatched task {len(tasks)}: {task}")
+                        running.append(asyncio.create_task(run(task)))
+                    if parser.finished:
+                        break
+            except Exception as e:
+                print(f"[RECOVER] Planner stream interrupted: {e}")
+            results = await asyncio.gather(*running)
+        finally:
+            # Cancelled turn: do not leave dispatched tasks running
+            for t in running:
+                t.cancel()
+        return self._merge(state, tasks, results)
+
+    def _merge(self, state: AgentState, tasks: List[dict], results: List[dict]) -> dict:
+        if not tasks:
+            print(f"[RECOVER] Planner produced no usable tasks.")
+            return {"tasks": [], "current_task": None, "intent": "Unknown"}
+
+        all_responses, retrieval = [], {}
+        ticket_id = state.get("ticket_id")
+        for result in results:
+            all_responses.extend(result.get("all_responses", []))
+            retrieval.update(result.get("retrieval", {}))
+            ticket_id = result.get("ticket_id") or ticket_id
+
+        print(f"[NODE] Planner completed {len(tasks)} streamed tasks.")
+        return {
+            "tasks": [],
+            "current_task": None,
+            "intent": "Multi-intent",
+            "ticket_id": ticket_id,
+            "retrieval": retrieval,
+            "all_responses": all_responses
+        }
+
+    @staticmethod
+    def _task_config(config: Optional[RunnableConfig], task: dict) -> RunnableConfig:
+        # Named (and tagged) like the domain node, so events and tracing treat it as that node
+        node = task["agent"].lower()
+        patched = patch_config(config, run_name=node)
+        patched["metadata"] = {**patched.get("metadata", {}), "langgraph_node": node}
+        return patched
+
+    def _run_task(self, state: AgentState, task: dict, config: Optional[RunnableConfig] = None) -> dict:
+        executor = self.executors.get(task["agent"])
+        if executor is None:
+            return {"all_responses": [f"System: No agent available for {task['agent']}."]}
+        try:
+            return executor.invoke({**state, "current_task": task["task"], "intent": task["agent"]}, self._task_config(config, task))
+        except Exception as e:
+            print(f"[RECOVER] {task['agent']} task failed: {e}")
+            return {"all_responses": [f"{task['agent']}: Unable to complete '{task['task']}'."]}
+
+    async def _arun_task(self, state: AgentState, task: dict, config: Optional[RunnableConfig] = None) -> dict:
+        executor = self.executors.get(task["agent"])
+        if executor is None:
+            return {"all_responses": [f"System: No agent available for {task['agent']}."]}
+        try:
+            return await executor.ainvoke({**state, "current_task": task["task"], "intent": task["agent"]}, self._task_config(config, task))
+        except Exception as e:
+            print(f"[RECOVER] {task['agent']} task failed: {e}")
+            return {"all_responses": [f"{task['agent']}: Unable to complete '{task['task']}'."]}
@@ -1,19 +1,81 @@
+from startup import startup_timer, serve_preforked
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel
 from typing import List, Optional, AsyncGenerator
 from langchain_core.messages import HumanMessage
-from graph.workflow import app as graph_app, reindex_domain
+from graph.workflow import get_app, is_built, reindex_domain, use_checkpointer
+from rag.prefetch import prefetcher
+from rag.working_set import working_set
+from tools.ticket_index import open_tickets
+from tracing import tracer
+from graph.batch import BatchRunner, parse_jsonl
+from graph.events import stream_graph
+from graph.job_queue import job_queue
+from graph.escalations import escalations
+from audit.store import audit_store
+from api.model_catalog import model_catalog
+from config import (
+    UNIFIED_INDEX_ENABLED, AUDIT_PAGE_MAX, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, BATCH_DIR, CHECKPOINT_BACKEND, CHECKPOINT_DB_PATH,
+    ESCALATION_PAGE_MAX, ESCALATION_RESUME_CONCURRENCY, ESCALATION_RESUME_MAX_CONCURRENCY, EXECUTION_MODE, STARTUP_WARMUP
+)
+from contextlib import AsyncExitStack, asynccontextmanager
+from itertools import islice
+import argparse
 import uuid
 import json
 import asyncio
 import os
 import shutil
-import requests
-import sqlite3
+import httpx
+import re
+
+startup_timer.mark("imports")
 
-app = FastAPI(title="Enterprise AI Service Desk API")
+# Audit rows fetched per worker-thread hop while streaming /audit
+AUDIT_FETCH_ROWS = 200
+
+def warm_up():
+    """
+    Builds the agents, RAG indexes and compiled graph, then marks the service ready.
+    """
+    get_app()
+    startup_timer.set_ready()
+
+async def get_graph():
+    """
+    The compiled graph for request handlers. Before warm-up finishes the build (or joins
+    the one in progress) runs in a worker thread so the event loop keeps serving.
+    """
+    if is_built():
+        return get_app()
+    return await asyncio.to_thread(get_app)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Audit schema and retention at startup; the one-time legacy import runs in the background
+    await asyncio.to_thread(audit_store.initialize)
+    app.state.audit_import = asyncio.create_task(asyncio.to_thread(audit_store.import_pending_legacy))
+    async with AsyncExitStack() as stack:
+        if EXECUTION_MODE != "queue" and CHECKPOINT_BACKEND == "sqlite":
+            # Shared thread state: any API worker can continue any thread. The saver binds to
+            # this event loop, so each (forked) worker opens its own connection here.
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+            use_checkpointer(await stack.enter_async_context(AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB_PATH)))
+        # eager: bind only once warm; background: bind immediately, /ready flips when warm; lazy: first request builds
+        if EXECUTION_MODE == "queue":
+            # Graph workers own the graph; this front-end is ready as soon as it can enqueue
+            startup_timer.set_ready()
+        elif STARTUP_WARMUP == "eager":
+            await asyncio.to_thread(warm_up)
+        elif STARTUP_WARMUP == "background":
+            app.state.warmup = asyncio.create_task(asyncio.to_thread(warm_up))
+        yield
+        await model_catalog.close()
+
+app = FastAPI(title="Enterprise AI Service Desk API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +92,14 @@ class ChatRequest(BaseModel):
     model: Optional[str] = None
     api_key: Optional[str] = None
 
+class BulkApproveRequest(BaseModel):
+    thread_ids: Optional[List[str]] = None  # Explicit threads, or select pending ones by the filters below
+    intent: Optional[str] = None
+    max_confidence: Optional[float] = None
+    older_than: Optional[float] = None
+    limit: int = 100
+    concurrency: int = ESCALATION_RESUME_CONCURRENCY
+
 class ModelFetchRequest(BaseModel):
     provider: str
     api_key: str
@@ -39,42 +109,82 @@ class ModelFetchRequest(BaseModel):
 async def health():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until the graph is built. Includes the startup phase timings.
+    """
+    report = startup_timer.report()
+    if is_built() and not report["ready"]:
+        # Built on demand by a request (lazy mode)
+        startup_timer.set_ready()
+        report = startup_timer.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics/prefetch")
+async def prefetch_metrics():
+    """
+    Speculative retrieval counters (hits vs. wasted prefetches).
+    """
+    return prefetcher.stats
+
+@app.get("/metrics/index")
+async def index_metrics():
+    """
+    Unified vector index layout (flat/IVF), size per domain and rebalance count.
+    """
+    if not UNIFIED_INDEX_ENABLED:
+        return {"enabled": False}
+    from rag.unified import unified_index
+    return {"enabled": True, **unified_index.describe()}
+
+@app.get("/metrics/working-set")
+async def working_set_metrics():
+    """
+    Follow-up retrieval counters (reused / re-ranked working sets vs. full searches).
+    """
+    return working_set.stats
+
+@app.get("/tickets/clusters")
+async def ticket_clusters(min_size: int = 1):
+    """
+    Open-ticket clusters from near-duplicate detection, largest first (incident detection).
+    """
+    return open_tickets.cluster_stats(min_size=min_size)
+
 @app.post("/fetch-models")
 async def fetch_models(request: ModelFetchRequest):
     """
     Dynamically fetches models from the chosen provider using the user's API key.
+    Served from the async model catalogue (cached per provider and key, refreshed in the background).
     """
     try:
-        if request.provider == "openai":
-            headers = {"Authorization": f"Bearer {request.api_key}"}
-            res = requests.get("https://api.openai.com/v1/models", headers=headers)
-            models = [m["id"] for m in res.json().get("data", []) if "gpt" in m["id"]]
-            return {"models": sorted(models)}
-        
-        elif request.provider == "groq":
-            headers = {"Authorization": f"Bearer {request.api_key}"}
-            res = requests.get("https://api.groq.com/openai/v1/models", headers=headers)
-            models = [m["id"] for m in res.json().get("data", [])]
-            return {"models": sorted(models)}
-            
-        elif request.provider == "openrouter":
-            headers = {"Authorization": f"Bearer {request.api_key}"}
-            res = requests.get("https://openrouter.ai/api/v1/models", headers=headers)
-            # OpenRouter has MANY models, we filter for common ones
-            data = res.json().get("data", [])
-            models = [m["id"] for m in data if any(x in m["id"] for x in ["claude", "gpt", "gemini", "llama"])]
-            return {"models": sorted(models)}
-
-        elif request.provider == "local":
-            url = request.base_url or "http://localhost:11434"
-            res = requests.get(f"{url}/api/tags")
-            models = [m["name"] for m in res.json().get("models", [])]
-            return {"models": sorted(models)}
-
-        return {"models": []}
+        return await model_catalog.get(request.provider, request.api_key, request.base_url)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail=f"{request.provider} did not answer in time")
+    except httpx.HTTPStatusError as e:
+        # Pass auth failures through; anything else upstream is a bad gateway
+        status = e.response.status_code if e.response.status_code in (401, 403) else 502
+        raise HTTPException(status_code=status, detail=f"{request.provider} returned {e.response.status_code}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics/jobs")
+async def job_metrics():
+    """
+    Job queue depth by status (EXECUTION_MODE=queue).
+    """
+    if EXECUTION_MODE != "queue":
+        return {"mode": EXECUTION_MODE, "jobs": {}}
+    return {"mode": EXECUTION_MODE, "jobs": await asyncio.to_thread(job_queue.depth)}
+
+@app.get("/metrics/models")
+async def model_catalog_metrics():
+    """
+    Model catalogue cache counters (fresh/stale hits, coalesced lookups, upstream fetches).
+    """
+    return model_catalog.stats
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...), domain: str = Form(...)):
     """
@@ -99,109 +209,305 @@ async def upload_file(file: UploadFile = File(...), domain: str = Form(...)):
 async def chat_stream(request: ChatRequest):
     thread_id = request.thread_id or str(uuid.uuid4())
     config = {"configurable": {"thread_id": thread_id}, "version": "v2"}
-    
-    # Audit Logging Setup
-    audit_conn = sqlite3.connect("audit_log.db")
-    audit_cursor = audit_conn.cursor()
-    audit_cursor.execute("CREATE TABLE IF NOT EXISTS logs (time TEXT, thread_id TEXT, message TEXT, provider TEXT, response TEXT)")
-    audit_conn.commit()
+    config_override = {
+        "provider": request.provider,
+        "model": request.model,
+        "api_key": request.api_key
+    }
 
     async def event_generator() -> AsyncGenerator[dict, None]:
         print(f"[API] Orchestrating: {request.message[:30]}...")
-        yield {"event": "status", "data": json.dumps({"node": "init", "thread_id": thread_id, "provider": request.provider, "model": request.model})}
-        
-        initial_state = {
-            "messages": [HumanMessage(content=request.message)],
-            "all_responses": [],
-            "config_override": {
-                "provider": request.provider,
-                "model": request.model,
-                "api_key": request.api_key
-            }
-        }
-        
         full_response_content = ""
-        
+        trace, stream_error = None, None
+
         try:
-            # Using astream_events v2 for granular token streaming
-            async for event in graph_app.astream_events(initial_state, config, version="v2"):
-                kind = event.get("event")
-                
-                # 1. Node Start/End Updates
-                if kind == "on_chain_start" and event.get("name") == "LangGraph":
-                    continue # Global chain start
-                
-                if kind == "on_node_start":
-                    node_name = event.get("name")
-                    yield {"event": "node_update", "data": json.dumps({"node": node_name, "status": "active"})}
-                
-                # 2. Token Streaming (from LLM calls within nodes)
-                if kind == "on_chat_model_stream":
-                    content = event["data"]["chunk"].content
-                    if content:
-                        yield {"event": "token", "data": json.dumps({"token": content})}
-                
-                # 3. Agent Thought/Decision Capture (Node Outputs)
-                if kind == "on_chain_end":
-                    node_name = event.get("name")
-                    raw_output = event.get("data", {}).get("output")
-                    
-                    def serialize_output(obj):
-                        if hasattr(obj, "dict"): return obj.dict()
-                        if hasattr(obj, "to_json"): return obj.to_json()
-                        if isinstance(obj, (list, tuple)): return [serialize_output(x) for x in obj]
-                        if isinstance(obj, dict): return {k: serialize_output(v) for k, v in obj.items()}
-                        if hasattr(obj, "content"): return obj.content # Handle LangChain Messages
-                        return str(obj)
-
-                    # Filter for our specific agent nodes
-                    if node_name in ["supervisor", "planner", "it", "hr", "finance", "privacy_shield", "consume_task"]:
-                        safe_output = serialize_output(raw_output)
-                        yield {"event": "agent_thought", "data": json.dumps({
-                            "node": node_name,
-                            "output": safe_output,
-                            "status": "completed"
-                        })}
-
-                # 4. Final Graph Output (Metadata & Token Consolidation)
-                if kind == "on_chain_end" and event.get("name") == "LangGraph":
-                    # We look for the final output of the entire graph
-                    output = event.get("data", {}).get("output")
-                    if isinstance(output, dict) and "response" in output:
-                        full_response_content = output["response"]
-                        # ALWAYS emit final response to ensure frontend state (streaming=false) resolves correctly
-                        yield {"event": "final_response", "data": json.dumps({
-                            "response": full_response_content,
-                            "ticket_id": output.get("ticket_id"),
-                            "escalation": output.get("escalation")
-                        })}
+            if EXECUTION_MODE == "queue":
+                # A graph worker runs the workflow (and traces it); this process only relays its events
+                job_id = await asyncio.to_thread(job_queue.submit, "chat", {"message": request.message, "provider": request.provider, "config_override": config_override}, thread_id)
+                yield {"event": "status", "data": json.dumps({"node": "init", "thread_id": thread_id, "provider": request.provider, "model": request.model, "job_id": job_id})}
+                events = job_queue.relay(job_id)
+            else:
+                # One trace per request; the callback handler turns nodes/LLM/tool runs into spans
+                trace = tracer.start_trace("chat", thread_id=thread_id, provider=request.provider or "", model=request.model or "")
+                config["callbacks"] = tracer.callbacks(trace)
+                graph_app = await get_graph()
+                yield {"event": "status", "data": json.dumps({"node": "init", "thread_id": thread_id, "provider": request.provider, "model": request.model, "trace_id": trace.trace_id if trace else None})}
+                initial_state = {
+                    "messages": [HumanMessage(content=request.message)],
+                    "all_responses": [],
+                    "config_override": config_override
+                }
+                events = stream_graph(graph_app, initial_state, config)
+
+            async for sse in events:
+                if sse["event"] == "final_response":
+                    full_response_content = json.loads(sse["data"])["response"]
+                yield sse
+            if EXECUTION_MODE != "queue":
+                # Queue mode: the worker tracks escalations where the checkpoints live
+                await escalations.track(graph_app, config)
             
         except Exception as e:
             print(f"[CRITICAL] Streaming Failure: {e}")
+            stream_error = e
             yield {"event": "error", "data": str(e)}
         
         finally:
             # Record to Audit Log (Always runs)
             if full_response_content:
                 try:
-                    audit_cursor.execute("INSERT INTO logs VALUES (datetime('now'), ?, ?, ?, ?)", 
-                                        (thread_id, request.message, request.provider, full_response_content))
-                    audit_conn.commit()
+                    with tracer.span("audit.write", kind="client"):
+                        await asyncio.to_thread(audit_store.write, thread_id, request.message, request.provider, full_response_content)
                 except Exception as db_e:
                     print(f"[AUDIT] Failed to write log: {db_e}")
-            audit_conn.close()
+            tracer.finish_trace(trace, stream_error)
 
     return EventSourceResponse(event_generator())
 
-@app.post("/approve/{thread_id}")
-async def approve_step(thread_id: str):
-    config = {"configurable": {"thread_id": thread_id}}
+# Results files of batch jobs running in this process
+_running_batches = set()
+
+def _batch_output_path(job_id: str) -> str:
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]", "", job_id)
+    if not safe_id:
+        raise HTTPException(status_code=400, detail="Invalid job_id")
+    return os.path.join(BATCH_DIR, f"{safe_id}.jsonl")
+
+@app.post("/chat/batch")
+async def chat_batch(file: UploadFile = File(...), job_id: Optional[str] = Form(None), concurrency: int = Form(BATCH_CONCURRENCY)):
+    """
+    Runs a JSONL backlog ({"id", "message", ...} per line) through the graph.
+    Streams progress as SSE; re-posting the same job_id resumes after a crash (and retries
+    failed items), while a job_id that is still running is refused with 409.
+    The job keeps running in the background if the client disconnects.
+    """
+    job_id = job_id or str(uuid.uuid4())
+    output_path = _batch_output_path(job_id)
+    if output_path in _running_batches:
+        # Two runs appending to one results file would duplicate and interleave records
+        raise HTTPException(status_code=409, detail=f"Batch job {job_id} is already running")
+    # Reserved before the first await, so a concurrent duplicate always sees it
+    _running_batches.add(output_path)
     try:
-        result = graph_app.invoke(None, config)
-        return {"status": "resumed", "result": result}
+        os.makedirs(BATCH_DIR, exist_ok=True)
+        items = parse_jsonl((await file.read()).decode("utf-8").splitlines(), file.filename)
+        runner = BatchRunner(await get_graph(), concurrency=max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    except BaseException:
+        _running_batches.discard(output_path)
+        raise
+
+    progress_queue: asyncio.Queue = asyncio.Queue()
+    job = asyncio.create_task(runner.run(items, output_path, job_id=job_id, on_progress=progress_queue.put_nowait))
+    job.add_done_callback(lambda _: _running_batches.discard(output_path))
+    job.add_done_callback(lambda _: progress_queue.put_nowait(None))
+
+    async def event_generator() -> AsyncGenerator[dict, None]:
+        yield {"event": "status", "data": json.dumps({"job_id": job_id, "items": len(items)})}
+        while True:
+            progress = await progress_queue.get()
+            if progress is None:
+                break
+            yield {"event": "progress", "data": json.dumps(progress)}
+        if job.exception():
+            yield {"event": "error", "data": str(job.exception())}
+        else:
+            yield {"event": "batch_complete", "data": json.dumps(job.result())}
+
+    return EventSourceResponse(event_generator())
+
+@app.get("/chat/batch/{job_id}")
+async def chat_batch_results(job_id: str):
+    """
+    Downloads the results JSONL of a batch job.
+    """
+    output_path = _batch_output_path(job_id)
+    if not os.path.exists(output_path):
+        raise HTTPException(status_code=404, detail="Unknown batch job")
+    return FileResponse(output_path, media_type="application/x-ndjson")
+
+@app.get("/audit")
+async def audit_search(q: Optional[str] = None, thread_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                       limit: int = 100, cursor: Optional[str] = None, order: str = "desc"):
+    """
+    Compliance search over the audit log, streamed as NDJSON (one row per line).
+    The last line is {"next_cursor": ...}; pass it back as `cursor` for the next page (null = done).
+    `q` is full-text over message and response; since/until take ISO datetimes or epoch seconds.
+    """
+    if not 1 <= limit <= AUDIT_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {AUDIT_PAGE_MAX}")
+    if order not in ("desc", "asc"):
+        raise HTTPException(status_code=400, detail="order must be 'desc' or 'asc'")
+    def fetch(rows) -> list:
+        return list(islice(rows, AUDIT_FETCH_ROWS))
+
+    try:
+        rows = audit_store.search(q, thread_id, since, until, limit=limit, cursor=cursor, order=order)
+        # Validate the arguments before the response starts streaming
+        page = await asyncio.to_thread(fetch, rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def stream():
+        # Every SQLite page fetch runs in a worker thread, off the event loop
+        nonlocal page
+        count, last = 0, None
+        while page:
+            count, last = count + len(page), page[-1]
+            yield "".join(json.dumps(row) + "\n" for row in page)
+            page = await asyncio.to_thread(fetch, rows)
+        next_cursor = audit_store.encode_cursor(last) if count == limit else None
+        yield json.dumps({"next_cursor": next_cursor, "count": count}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def resume_thread(thread_id: str) -> dict:
+    """
+    Runs the tail (escalation node) of a thread paused before escalation.
+    @returns The graph's final output ({"response", "ticket_id", ...})
+    """
+    if EXECUTION_MODE == "queue":
+        # The thread's checkpoints live with the graph workers: resume it there
+        job_id = await asyncio.to_thread(job_queue.submit, "resume", {}, thread_id)
+        async for sse in job_queue.relay(job_id):
+            if sse["event"] == "error":
+                raise RuntimeError(sse["data"])
+        return (await asyncio.to_thread(job_queue.status, job_id))["result"] or {}
+
+    graph_app = await get_graph()
+    trace = tracer.start_trace("escalation.resume", thread_id=thread_id)
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": tracer.callbacks(trace)}
+    error = None
+    try:
+        return await graph_app.ainvoke(None, config)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        error = e
+        raise
+    finally:
+        tracer.finish_trace(trace, error)
+
+async def thread_paused(thread_id: str) -> bool:
+    """
+    Whether this process can resume the thread: its checkpoint is paused before escalation.
+    """
+    graph_app = await get_graph()
+    snapshot = await graph_app.aget_state({"configurable": {"thread_id": thread_id}})
+    return "escalation" in (snapshot.next or ())
+
+# Inline mode checks for a checkpoint before claiming (a MemorySaver loses it on restart);
+# queue-mode workers share persistent SQLite checkpoints
+resume_check = thread_paused if EXECUTION_MODE != "queue" else None
+
+@app.get("/escalations")
+async def list_escalations(status: Optional[str] = "pending", intent: Optional[str] = None, min_confidence: Optional[float] = None,
+                           max_confidence: Optional[float] = None, older_than: Optional[float] = None, sort: str = "age",
+                           limit: int = 50, cursor: Optional[str] = None):
+    """
+    Operator view of escalated threads, oldest (or least confident) first.
+    Pass next_cursor back as `cursor` for the next page (null = done).
+    """
+    try:
+        return await asyncio.to_thread(escalations.list, status or None, intent, min_confidence, max_confidence, older_than, sort, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/escalations/stats")
+async def escalation_stats():
+    """
+    Escalation counts by status, pending ones by intent, and the age of the oldest pending thread.
+    """
+    return await asyncio.to_thread(escalations.counts)
+
+@app.post("/escalations/approve")
+async def bulk_approve(request: BulkApproveRequest):
+    """
+    Approves many escalated threads: explicit thread_ids, or pending threads matching the filters.
+    Resumes run in the background with bounded parallelism (and keep going if the client
+    disconnects); each result is streamed as an SSE "result" event as it completes.
+    """
+    if not 1 <= request.limit <= ESCALATION_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {ESCALATION_PAGE_MAX}")
+    if not 1 <= request.concurrency <= ESCALATION_RESUME_MAX_CONCURRENCY:
+        raise HTTPException(status_code=400, detail=f"concurrency must be between 1 and {ESCALATION_RESUME_MAX_CONCURRENCY}")
+    if request.thread_ids is not None and len(request.thread_ids) > ESCALATION_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {ESCALATION_PAGE_MAX} thread_ids per request")
+    thread_ids = request.thread_ids
+    if thread_ids is None:
+        thread_ids = await asyncio.to_thread(escalations.pending_ids, request.intent, request.max_confidence, request.older_than, request.limit)
+
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def run() -> dict:
+        summary = {"total": len(thread_ids)}
+        async for result in escalations.approve_many(thread_ids, resume_thread, concurrency=request.concurrency, paused=resume_check):
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+            results.put_nowait(result)
+        return summary
+
+    job = asyncio.create_task(run())
+    job.add_done_callback(lambda _: results.put_nowait(None))
+
+    async def event_generator() -> AsyncGenerator[dict, None]:
+        yield {"event": "status", "data": json.dumps({"threads": len(thread_ids), "concurrency": request.concurrency})}
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield {"event": "result", "data": json.dumps(result)}
+        if job.exception():
+            yield {"event": "error", "data": str(job.exception())}
+        else:
+            yield {"event": "bulk_complete", "data": json.dumps(job.result())}
+
+    return EventSourceResponse(event_generator())
+
+@app.post("/approve/{thread_id}")
+async def approve_step(thread_id: str):
+    """
+    Approves one escalated thread. Idempotent: repeating it returns the first result
+    ("already_resumed") instead of running the escalation again. A thread whose checkpoint
+    is gone is marked orphaned (410).
+    """
+    result = await escalations.approve(thread_id, resume_thread, resume_check)
+    if result["status"] == "not_found" and EXECUTION_MODE != "queue":
+        # Paused before the escalation queue saw it (e.g. via a script): index it now
+        graph_app = await get_graph()
+        if await escalations.track(graph_app, {"configurable": {"thread_id": thread_id}}):
+            result = await escalations.approve(thread_id, resume_thread, resume_check)
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail=f"No escalation pending for thread {thread_id}")
+    if result["status"] == "orphaned":
+        raise HTTPException(status_code=410, detail=f"Thread {thread_id} has no paused checkpoint left to resume")
+    if result["status"] == "failed":
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
+
+def main():
+    """
+    Runs the API server, e.g.:
+        python api/main.py                              # single process
+        python api/main.py --preload --workers 4        # warm once, fork 4 workers sharing the socket
+    Without --preload, multiple workers each import and warm up independently.
+    Inline mode with several workers requires CHECKPOINT_BACKEND=sqlite so they share thread state.
+    """
+    parser = argparse.ArgumentParser(description="Enterprise AI Service Desk API server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--preload", action="store_true", help="Build the graph before forking workers (POSIX only)")
+    args = parser.parse_args()
+    if args.workers > 1 and EXECUTION_MODE != "queue" and CHECKPOINT_BACKEND != "sqlite":
+        # Per-process MemorySaver: follow-ups and /approve landing on a sibling worker would find no checkpoint
+        parser.error("--workers > 1 needs shared thread state: set CHECKPOINT_BACKEND=sqlite (or EXECUTION_MODE=queue)")
 
-if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if args.preload and args.workers > 1 and hasattr(os, "fork"):
+        serve_preforked(app, args.host, args.port, args.workers, warm_up)
+    elif args.workers > 1:
+        uvicorn.run("api.main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        if args.preload:
+            warm_up()
+        uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
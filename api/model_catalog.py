@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+from config import (
+    MODEL_CATALOG_TTL_SECONDS, MODEL_CATALOG_STALE_SECONDS, MODEL_CATALOG_TIMEOUT_SECONDS,
+    MODEL_CATALOG_LOCAL_TIMEOUT_SECONDS, MODEL_CATALOG_MAX_ENTRIES
+)
+
+def _ids(data: dict, keep: Callable[[str], bool] = lambda _: True) -> List[str]:
+    return sorted(m["id"] for m in data.get("data", []) if keep(m["id"]))
+
+# provider -> (models URL, parser); "local" is resolved against the caller's base_url
+PROVIDERS = {
+    "openai": ("https://api.openai.com/v1/models", lambda data: _ids(data, lambda i: "gpt" in i)),
+    "groq": ("https://api.groq.com/openai/v1/models", _ids),
+    # OpenRouter has MANY models, we filter for common ones
+    "openrouter": ("https://openrouter.ai/api/v1/models", lambda data: _ids(data, lambda i: any(x in i for x in ["claude", "gpt", "gemini", "llama"]))),
+    "local": ("/api/tags", lambda data: sorted(m["name"] for m in data.get("models", [])))
+}
+
+class ModelCatalog:
+    """
+    Async, cached model listing for /fetch-models.
+    - Pooled keep-alive httpx clients with strict timeouts (a shorter one for the local Ollama server).
+    - TTL cache keyed by (provider, API key hash, base URL); keys themselves are never stored.
+    - Stale-while-revalidate: entries past the TTL but within the stale window are served
+      immediately while one background refresh replaces them.
+    - Concurrent lookups for the same key share a single upstream request.
+    """
+    def __init__(self, ttl: float = MODEL_CATALOG_TTL_SECONDS, stale: float = MODEL_CATALOG_STALE_SECONDS, max_entries: int = MODEL_CATALOG_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[tuple, Tuple[float, List[str]]]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._refreshes = set()  # Strong references to background refresh tasks
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "errors": 0}
+
+    @staticmethod
+    def cache_key(provider: str, api_key: Optional[str], base_url: Optional[str] = None) -> tuple:
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return provider, key_hash, (base_url or "").rstrip("/")
+
+    def _client(self, provider: str) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the serving event loop (and is never shared across forks)
+        kind = "local" if provider == "local" else "cloud"
+        if kind not in self._clients:
+            timeout = MODEL_CATALOG_LOCAL_TIMEOUT_SECONDS if kind == "local" else MODEL_CATALOG_TIMEOUT_SECONDS
+            self._clients[kind] = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            )
+        return self._clients[kind]
+
+    async def get(self, provider: str, api_key: Optional[str], base_url: Optional[str] = None) -> dict:
+        """
+        Returns the provider's models, from cache when possible.
+        @param provider - openai | groq | openrouter | local
+        @param api_key - Caller's API key (sent upstream, only its hash is cached)
+        @param base_url - Ollama server URL for the local provider
+        @returns {"models": [...], "cached": bool, "stale": bool}
+        @throws httpx.HTTPError when the provider cannot be reached or rejects the key
+        """
+        if provider not in PROVIDERS:
+            return {"models": [], "cached": False, "stale": False}
+        if provider == "local":
+            base_url = base_url or "http://localhost:11434"
+        key = self.cache_key(provider, api_key, base_url)
+
+        entry = self._cache.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return {"models": entry[1], "cached": True, "stale": False}
+            if age < self.ttl + self.stale:
+                self.stats["stale_hits"] += 1
+                self._refresh(key, api_key)
+                return {"models": entry[1], "cached": True, "stale": True}
+
+        self.stats["misses"] += 1
+        # shield: a client disconnecting must not cancel the fetch other callers are awaiting
+        models = await asyncio.shield(self._fetch_shared(key, api_key))
+        return {"models": models, "cached": False, "stale": False}
+
+    def _fetch_shared(self, key: tuple, api_key: Optional[str]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return task
+        task = asyncio.create_task(self._fetch(key, api_key))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _refresh(self, key: tuple, api_key: Optional[str]):
+        if key in self._inflight:
+            return
+        task = self._fetch_shared(key, api_key)
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[MODELS] Background refresh failed, serving stale list: {task.exception()}")
+
+    async def _fetch(self, key: tuple, api_key: Optional[str]) -> List[str]:
+        provider, _, base_url = key
+        url, parse = PROVIDERS[provider]
+        headers = {}
+        if provider == "local":
+            url = f"{base_url}{url}"
+        else:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        self.stats["fetches"] += 1
+        started = time.perf_counter()
+        try:
+            res = await self._client(provider).get(url, headers=headers)
+            res.raise_for_status()
+            models = parse(res.json())
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+        self._cache[key] = (time.monotonic(), models)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        print(f"[MODELS] Fetched {len(models)} {provider} models in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return models
+
+    def invalidate(self, provider: Optional[str] = None):
+        for key in [k for k in self._cache if provider is None or k[0] == provider]:
+            del self._cache[key]
+
+    async def close(self):
+        for task in list(self._refreshes):
+            task.cancel()
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+# Shared instance used by the API process
+model_catalog = ModelCatalog()
@@ -0,0 +1,461 @@
+import argparse
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional
+from config import AUDIT_DIR, AUDIT_DB_PATH, AUDIT_PARTITION, AUDIT_RETENTION_DAYS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    time TEXT NOT NULL,
+    thread_id TEXT,
+    message TEXT,
+    provider TEXT,
+    response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(ts);
+CREATE INDEX IF NOT EXISTS idx_logs_thread_ts ON logs(thread_id, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(message, response, content='logs', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS logs_ai AFTER INSERT ON logs BEGIN
+    INSERT INTO logs_fts(rowid, message, response) VALUES (new.id, new.message, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS logs_ad AFTER DELETE ON logs BEGIN
+    INSERT INTO logs_fts(logs_fts, rowid, message, response) VALUES ('delete', old.id, old.message, old.response);
+END;
+CREATE TABLE IF NOT EXISTS legacy_rows (legacy_rowid INTEGER PRIMARY KEY);
+"""
+
+COLUMNS = "id, ts, time, thread_id, message, provider, response"
+PARTITION_PATTERN = re.compile(r"^audit_(\d{4}_\d{2}(?:_\d{2})?)\.db$")
+LEGACY_MARKER = ".legacy_imported"
+LEGACY_LOCK = ".legacy_import.lock"
+
+def parse_time(value) -> Optional[float]:
+    """
+    Accepts epoch seconds or an ISO date/datetime (naive values are UTC).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def fts_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query: every term must match, a trailing * is a prefix match.
+    Terms are quoted so user input can never be parsed as FTS syntax.
+    """
+    terms = []
+    for token in text.split():
+        prefix = token.endswith("*")
+        token = token.rstrip("*").replace('"', "")
+        if token:
+            terms.append(f'"{token}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+class AuditStore:
+    """
+    Time-partitioned audit log. Each period (month by default) is its own SQLite file
+    under AUDIT_DIR with indexes on ts and (thread_id, ts) and an FTS5 index over
+    message/response, so lookups by time, thread or keyword never scan old data.
+    - Writes roll over to a new file when the period changes; rollover also applies the
+      retention policy (whole expired files are deleted, the boundary file is trimmed).
+    - search() streams rows newest first with an opaque keyset cursor for the next page.
+    - The legacy single-table audit_log.db is imported once per directory: servers run
+      import_pending_legacy() in the background, other callers get it lazily on first use.
+      The import holds a file lock (several processes may start it) and records every legacy
+      rowid it copied, so an import interrupted by a crash resumes without duplicates.
+    """
+    def __init__(self, directory: str = AUDIT_DIR, partition: str = AUDIT_PARTITION, retention_days: int = AUDIT_RETENTION_DAYS, legacy_db: Optional[str] = AUDIT_DB_PATH):
+        if partition not in ("month", "day"):
+            raise ValueError(f"Unsupported audit partition period: {partition}")
+        self.directory = directory
+        self.partition = partition
+        self.retention_days = retention_days
+        self.legacy_db = legacy_db
+        self._lock = threading.Lock()
+        self._writers = {}  # partition name -> open write connection
+        self._initialized = False
+
+    # --- Partitions ---
+
+    def partition_name(self, ts: float) -> str:
+        moment = datetime.fromtimestamp(ts, timezone.utc)
+        return moment.strftime("%Y_%m") if self.partition == "month" else moment.strftime("%Y_%m_%d")
+
+    @staticmethod
+    def partition_bounds(name: str):
+        """
+        @returns (start, end) epoch seconds covered by a partition file
+        """
+        parts = [int(p) for p in name.split("_")]
+        if len(parts) == 2:
+            start = datetime(parts[0], parts[1], 1, tzinfo=timezone.utc)
+            end = datetime(parts[0] + parts[1] // 12, parts[1] % 12 + 1, 1, tzinfo=timezone.utc)
+        else:
+            start = datetime(parts[0], parts[1], parts[2], tzinfo=timezone.utc)
+            end = start + timedelta(days=1)
+        return start.timestamp(), end.timestamp()
+
+    def partitions(self) -> List[str]:
+        """
+        Partition names on disk, newest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        names = [m.group(1) for m in (PARTITION_PATTERN.match(f) for f in os.listdir(self.directory)) if m]
+        return sorted(names, key=self.partition_bounds, reverse=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"audit_{name}.db")
+
+    def _writer(self, name: str) -> sqlite3.Connection:
+        # Caller holds self._lock
+        conn = self._writers.get(name)
+        if conn is None:
+            # First write to a period in this process (startup or rollover)
+            self._apply_retention_locked(time.time())
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(self._path(name), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._writers[name] = conn
+        return conn
+
+    def _reader(self, name: str) -> sqlite3.Connection:
+        # Streaming responses may advance the generator from different worker threads
+        return sqlite3.connect(f"file:{self._path(name)}?mode=ro", uri=True, check_same_thread=False)
+
+    # --- Writes ---
+
+    def write(self, thread_id: str, message: str, provider: Optional[str], response: str, ts: Optional[float] = None):
+        self.write_many([{"thread_id": thread_id, "message": message, "provider": provider, "response": response, "ts": ts}])
+
+    def write_many(self, records: Iterable[dict]):
+        """
+        Appends audit rows ({"thread_id", "message", "provider", "response", optional "ts"}).
+        Rows are grouped per partition and committed once per partition.
+        """
+        self._ensure_initialized()
+        now = time.time()
+        cutoff = now - self.retention_days * 86400 if self.retention_days > 0 else None
+        grouped = {}
+        for r in records:
+            ts = r.get("ts") or now
+            if cutoff is not None and ts < cutoff:
+                continue
+            row = (ts, datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), r.get("thread_id"), r.get("message"), r.get("provider"), r.get("response"))
+            grouped.setdefault(self.partition_name(ts), []).append(row)
+        with self._lock:
+            for name, rows in grouped.items():
+                conn = self._writer(name)
+                conn.executemany("INSERT INTO logs (ts, time, thread_id, message, provider, response) VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.commit()
+
+    # --- Retention ---
+
+    def apply_retention(self, now: Optional[float] = None) -> dict:
+        """
+        Deletes audit data older than retention_days (0 keeps everything).
+        """
+        with self._lock:
+            return self._apply_retention_locked(now or time.time())
+
+    def _apply_retention_locked(self, now: float) -> dict:
+        result = {"dropped_partitions": [], "trimmed_rows": 0}
+        if self.retention_days <= 0:
+            return result
+        cutoff = now - self.retention_days * 86400
+        for name in self.partitions():
+            start, end = self.partition_bounds(name)
+            if end <= cutoff:
+                conn = self._writers.pop(name, None)
+                if conn:
+                    conn.close()
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(self._path(name) + suffix):
+                        os.remove(self._path(name) + suffix)
+                result["dropped_partitions"].append(name)
+            elif start < cutoff:
+                conn = self._writers.get(name) or sqlite3.connect(self._path(name))
+                result["trimmed_rows"] += conn.execute("DELETE FROM logs WHERE ts < ?", (cutoff,)).rowcount
+                conn.commit()
+                if name not in self._writers:
+                    conn.close()
+        if result["dropped_partitions"] or result["trimmed_rows"]:
+            print(f"[AUDIT] Retention ({self.retention_days}d): dropped {result['dropped_partitions']}, trimmed {result['trimmed_rows']} rows")
+        return result
+
+    # --- Legacy import ---
+
+    def initialize(self):
+        """
+        Opens the current partition (schema, retention) without the legacy import,
+        so server startup stays fast. Blocking: async servers call it in a worker thread.
+        """
+        with self._lock:
+            self._writer(self.partition_name(time.time()))
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self._initialized = True
+        self.import_pending_legacy()
+
+    def import_pending_legacy(self) -> int:
+        """
+        Imports the configured legacy database unless this directory already has it.
+        @returns Rows copied by this call
+        """
+        self._initialized = True
+        if not self.legacy_db or not os.path.exists(self.legacy_db):
+            return 0
+        marker = os.path.join(self.directory, LEGACY_MARKER)
+        if os.path.exists(marker):
+            return 0
+        with self._import_lock():
+            # Another process may have finished the import while this one waited
+            if os.path.exists(marker):
+                return 0
+            return self._import_rows(self.legacy_db)
+
+    def import_legacy(self, path: str, chunk_size: int = 5000) -> int:
+        """
+        Copies rows of the old unindexed `logs` table into partitions (a marker file records it).
+        Re-running it only copies rows not imported yet.
+        """
+        self._initialized = True
+        with self._import_lock():
+            return self._import_rows(path, chunk_size)
+
+    @contextmanager
+    def _import_lock(self):
+        # Cross-process: released when the file is closed (or the holder dies)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LEGACY_LOCK), "a+") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            yield
+
+    def _import_rows(self, path: str, chunk_size: int = 5000) -> int:
+        source = sqlite3.connect(path)
+        try:
+            cursor = source.execute("SELECT rowid, time, thread_id, message, provider, response FROM logs ORDER BY rowid")
+        except sqlite3.OperationalError:
+            source.close()
+            return 0
+        imported = 0
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            imported += self._write_legacy(chunk)
+        source.close()
+        with open(os.path.join(self.directory, LEGACY_MARKER), "w", encoding="utf-8") as f:
+            json.dump({"source": os.path.abspath(path), "rows": imported, "imported_at": time.time()}, f)
+        print(f"[AUDIT] Imported {imported} rows from legacy {path}")
+        return imported
+
+    def _write_legacy(self, chunk: List[tuple]) -> int:
+        """
+        Inserts legacy (rowid, time, thread_id, message, provider, response) rows whose rowid
+        is not yet in the partition's legacy_rows ledger, committing row and ledger together.
+        @returns Rows inserted
+        """
+        now = time.time()
+        cutoff = now - self.retention_days * 86400 if self.retention_days > 0 else None
+        grouped = {}
+        for r in chunk:
+            ts = (parse_time(r[1]) if r[1] else None) or now
+            if cutoff is not None and ts < cutoff:
+                continue
+            row = (ts, datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), r[2], r[3], r[4], r[5])
+            grouped.setdefault(self.partition_name(ts), []).append((r[0], row))
+        inserted = 0
+        with self._lock:
+            for name, rows in grouped.items():
+                conn = self._writer(name)
+                with conn:
+                    for legacy_rowid, row in rows:
+                        if conn.execute("INSERT OR IGNORE INTO legacy_rows (legacy_rowid) VALUES (?)", (legacy_rowid,)).rowcount:
+                            conn.execute("INSERT INTO logs (ts, time, thread_id, message, provider, response) VALUES (?, ?, ?, ?, ?, ?)", row)
+                            inserted += 1
+        return inserted
+
+    # --- Queries ---
+
+    @staticmethod
+    def encode_cursor(row: dict) -> str:
+        partition, rowid = row["id"].split(":")
+        return base64.urlsafe_b64encode(json.dumps([partition, row["ts"], int(rowid)]).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            partition, ts, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return partition, float(ts), int(rowid)
+        except Exception:
+            raise ValueError("Invalid audit cursor")
+
+    def search(self, q: Optional[str] = None, thread_id: Optional[str] = None, since=None, until=None,
+               limit: int = 100, cursor: Optional[str] = None, order: str = "desc", fetch_size: int = 500) -> Iterator[dict]:
+        """
+        Streams matching rows across partitions without materializing the result set.
+        @param q - Full-text terms over message and response (all must match)
+        @param thread_id - Exact thread filter (uses the (thread_id, ts) index)
+        @param since/until - Epoch seconds or ISO datetime; since is inclusive, until exclusive
+        @param limit - Page size (None streams everything)
+        @param cursor - encode_cursor() of the last row of the previous page
+        @param order - "desc" (newest first) or "asc"
+        @returns Iterator of row dicts; "id" is "<partition>:<rowid>"
+        """
+        self._ensure_initialized()
+        descending = order != "asc"
+        since_ts, until_ts = parse_time(since), parse_time(until)
+        after = self.decode_cursor(cursor) if cursor else None
+        match = fts_query(q) if q else None
+        if q and not match:
+            return
+
+        names = self.partitions()
+        if not descending:
+            names.reverse()
+        remaining = limit
+        for name in names:
+            start, end = self.partition_bounds(name)
+            if (since_ts is not None and end <= since_ts) or (until_ts is not None and start >= until_ts):
+                continue
+            if after:
+                # Skip partitions already fully paged through
+                after_start = self.partition_bounds(after[0])[0]
+                if (descending and start > after_start) or (not descending and start < after_start):
+                    continue
+
+            where, params = [], []
+            if match:
+                where.append("id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)")
+                params.append(match)
+            if thread_id:
+                where.append("thread_id = ?")
+                params.append(thread_id)
+            if since_ts is not None:
+                where.append("ts >= ?")
+                params.append(since_ts)
+            if until_ts is not None:
+                where.append("ts < ?")
+                params.append(until_ts)
+            if after and after[0] == name:
+                op = "<" if descending else ">"
+                where.append(f"(ts {op} ? OR (ts = ? AND id {op} ?))")
+                params.extend([after[1], after[1], after[2]])
+            direction = "DESC" if descending else "ASC"
+            sql = f"SELECT {COLUMNS} FROM logs"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += f" ORDER BY ts {direction}, id {direction}"
+            if remaining is not None:
+                sql += f" LIMIT {int(remaining)}"
+
+            conn = self._reader(name)
+            try:
+                rows = conn.execute(sql, params)
+                while True:
+                    chunk = rows.fetchmany(fetch_size)
+                    if not chunk:
+                        break
+                    for r in chunk:
+                        yield {"id": f"{name}:{r[0]}", "ts": r[1], "time": r[2], "thread_id": r[3], "message": r[4], "provider": r[5], "response": r[6]}
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            finally:
+                conn.close()
+            if remaining is not None and remaining <= 0:
+                return
+
+    def stats(self) -> dict:
+        self._ensure_initialized()
+        partitions = []
+        for name in self.partitions():
+            conn = self._reader(name)
+            rows = conn.execute("SELECT COUNT(*), MIN(time), MAX(time) FROM logs").fetchone()
+            conn.close()
+            partitions.append({"partition": name, "rows": rows[0], "first": rows[1], "last": rows[2], "bytes": os.path.getsize(self._path(name))})
+        return {"directory": self.directory, "retention_days": self.retention_days, "partitions": partitions}
+
+    def close(self):
+        with self._lock:
+            for conn in self._writers.values():
+                conn.close()
+            self._writers.clear()
+
+# Shared audit store for the API and batch runs
+audit_store = AuditStore()
+
+def main():
+    """
+    Audit log maintenance and compliance queries, e.g.:
+        python -m audit.store stats
+        python -m audit.store search "vpn broken" --since 2026-01-01 --limit 50
+        python -m audit.store prune
+        python -m audit.store import old_audit_log.db
+    """
+    parser = argparse.ArgumentParser(description="Partitioned audit log tools.")
+    parser.add_argument("--dir", default=AUDIT_DIR, help="Partition directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats", help="Rows and size per partition")
+    sub.add_parser("prune", help="Apply the retention policy now")
+
+    importer = sub.add_parser("import", help="Import a legacy single-table audit database")
+    importer.add_argument("path")
+
+    search = sub.add_parser("search", help="Query the log (JSONL on stdout)")
+    search.add_argument("q", nargs="?", help="Full-text terms")
+    search.add_argument("--thread-id")
+    search.add_argument("--since")
+    search.add_argument("--until")
+    search.add_argument("--limit", type=int, default=100, help="0 = no limit")
+    search.add_argument("--order", choices=["desc", "asc"], default="desc")
+    args = parser.parse_args()
+
+    store = AuditStore(directory=args.dir)
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "prune":
+        print(json.dumps(store.apply_retention()))
+    elif args.command == "import":
+        store.import_legacy(args.path)
+    elif args.command == "search":
+        for row in store.search(args.q, args.thread_id, args.since, args.until, args.limit or None, order=args.order):
+            print(json.dumps(row))
+    store.close()
+
+if __name__ == "__main__":
+    main()
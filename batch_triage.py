@@ -0,0 +1,33 @@
+from graph.workflow import app as graph_app
+from graph.batch import BatchRunner, read_jsonl
+from config import BATCH_CONCURRENCY, BATCH_FLUSH_SIZE
+import argparse
+import asyncio
+import os
+
+def main():
+    """
+    Offline triage of a JSONL backlog, e.g.:
+        python batch_triage.py backlog.jsonl -o triage_results.jsonl --concurrency 16
+    Re-running with the same output file resumes where a crashed run stopped.
+    """
+    parser = argparse.ArgumentParser(description="Run a JSONL backlog of requests through the orchestrator.")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"message\"} object per line")
+    parser.add_argument("-o", "--output", help="Results JSONL (default: <input>.results.jsonl)")
+    parser.add_argument("--job-id", help="Prefix for thread ids (default: input file name)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--flush-size", type=int, default=BATCH_FLUSH_SIZE)
+    args = parser.parse_args()
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    job_id = args.job_id or os.path.splitext(os.path.basename(args.input))[0]
+
+    runner = BatchRunner(graph_app, concurrency=args.concurrency, flush_size=args.flush_size)
+    summary = asyncio.run(runner.run(read_jsonl(args.input), output, job_id=job_id))
+
+    print(f"\nBATCH SUMMARY ({output}):")
+    for key in ["total", "skipped", "completed", "errors", "escalated", "items_per_sec"]:
+        print(f"{key}: {summary.get(key)}")
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,63 @@ ACTIVE_PROVIDER = os.getenv("ACTIVE_PROVIDER", "openai")
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 VECTOR_STORE_DIR = os.path.join(os.path.dirname(__file__), "vector_stores")
 
+# Embeddings: "auto" (OpenAI when a key is set, else offline), "openai", "hashed" (offline n-gram model), "fake"
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "auto")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))  # Dimension of the offline hashed model
+
+# Unified vector index: one FAISS index for all domains with metadata filtering (see rag/unified.py)
+UNIFIED_INDEX_ENABLED = os.getenv("UNIFIED_INDEX_ENABLED", "false").lower() == "true"
+UNIFIED_IVF_THRESHOLD = int(os.getenv("UNIFIED_IVF_THRESHOLD", "50000"))  # Switch from exact flat search to IVF at this size
+UNIFIED_IVF_NPROBE = int(os.getenv("UNIFIED_IVF_NPROBE", "16"))
+
+# Graph execution: "inline" runs the workflow inside the API process; "queue" hands /chat to graph workers
+# (python graph_worker.py) over JOB_QUEUE_PATH and relays their events as SSE
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "inline")
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "job_queue.db")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db")  # Thread state shared by the graph workers
+# Inline-mode thread state: "memory" (per process) or "sqlite" (CHECKPOINT_DB_PATH, shared by all API workers)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory")
+GRAPH_WORKER_PROCESSES = int(os.getenv("GRAPH_WORKER_PROCESSES", "2"))
+GRAPH_WORKER_CONCURRENCY = int(os.getenv("GRAPH_WORKER_CONCURRENCY", "8"))  # Jobs in flight per worker process
+JOB_POLL_INTERVAL_MS = int(os.getenv("JOB_POLL_INTERVAL_MS", "20"))  # Idle polling (claims and event relay)
+JOB_EVENT_FLUSH_MS = int(os.getenv("JOB_EVENT_FLUSH_MS", "20"))  # Workers batch token events for this long
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))  # A silent worker loses its job after this
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))  # Finished jobs and their events
+JOB_CLAIM_TIMEOUT_SECONDS = float(os.getenv("JOB_CLAIM_TIMEOUT_SECONDS", "30"))  # Relayed job fails if no worker takes it
+JOB_RELAY_TIMEOUT_SECONDS = float(os.getenv("JOB_RELAY_TIMEOUT_SECONDS", "600"))  # Relayed job fails if not finished by then
+
+# Human escalation queue (threads paused before the escalation node, see graph/escalations.py)
+ESCALATION_DB_PATH = os.getenv("ESCALATION_DB_PATH", "escalations.db")
+ESCALATION_RESUME_CONCURRENCY = int(os.getenv("ESCALATION_RESUME_CONCURRENCY", "8"))  # Parallel resumes in a bulk approve
+ESCALATION_RESUME_MAX_CONCURRENCY = int(os.getenv("ESCALATION_RESUME_MAX_CONCURRENCY", "32"))  # Upper bound a request may ask for
+ESCALATION_CLAIM_TIMEOUT_SECONDS = float(os.getenv("ESCALATION_CLAIM_TIMEOUT_SECONDS", "300"))  # Retry a resume stuck this long
+ESCALATION_PAGE_MAX = int(os.getenv("ESCALATION_PAGE_MAX", "500"))
+
+# Model catalogue (/fetch-models): cached per (provider, key hash, base URL)
+MODEL_CATALOG_TTL_SECONDS = float(os.getenv("MODEL_CATALOG_TTL_SECONDS", "600"))  # Served without revalidation
+MODEL_CATALOG_STALE_SECONDS = float(os.getenv("MODEL_CATALOG_STALE_SECONDS", "3600"))  # Served stale while refreshing after the TTL
+MODEL_CATALOG_TIMEOUT_SECONDS = float(os.getenv("MODEL_CATALOG_TIMEOUT_SECONDS", "5"))
+MODEL_CATALOG_LOCAL_TIMEOUT_SECONDS = float(os.getenv("MODEL_CATALOG_LOCAL_TIMEOUT_SECONDS", "2"))  # Local Ollama server
+MODEL_CATALOG_MAX_ENTRIES = int(os.getenv("MODEL_CATALOG_MAX_ENTRIES", "256"))
+
+# Per-thread retrieval working set (follow-up turns re-rank previous chunks instead of searching from scratch)
+WORKING_SET_SIZE = int(os.getenv("WORKING_SET_SIZE", "8"))  # Chunks remembered per domain and thread
+WORKING_SET_FRESH_K = int(os.getenv("WORKING_SET_FRESH_K", "2"))  # Size of the extra search on a topic shift
+WORKING_SET_REUSE_OVERLAP = float(os.getenv("WORKING_SET_REUSE_OVERLAP", "0.8"))  # Term overlap that skips retrieval entirely
+WORKING_SET_COVERAGE = float(os.getenv("WORKING_SET_COVERAGE", "0.9"))  # Skip the fresh search if the best chunk keeps this share of its score
+
+# Speculative retrieval: search all domains while the Supervisor classifies
+RETRIEVAL_PREFETCH = os.getenv("RETRIEVAL_PREFETCH", "true").lower() == "true"
+PREFETCH_TIMEOUT_SECONDS = float(os.getenv("PREFETCH_TIMEOUT_SECONDS", "10"))
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "120"))
+PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", "256"))
+
+# Mock LLM pacing (used when no API key is configured or ACTIVE_PROVIDER=mock)
+MOCK_FIRST_TOKEN_MS = float(os.getenv("MOCK_FIRST_TOKEN_MS", "0"))
+MOCK_TOKEN_DELAY_MS = float(os.getenv("MOCK_TOKEN_DELAY_MS", "0"))
+
 # Model Specialization Mapping
 # Small/Fast models for simple logic, Large models for planning
 MODEL_ROUTING = {
@@ -25,14 +82,70 @@ MODEL_ROUTING = {
     "privacy": "gpt-4o-mini" if ACTIVE_PROVIDER == "openai" else "llama3-8b-8192"
 }
 
+# Ticketing Integration
+# "simulated" keeps everything in-process; "http" talks to TICKET_API_URL (see tools/ticket_stub_server.py)
+TICKET_BACKEND = os.getenv("TICKET_BACKEND", "simulated")
+TICKET_API_URL = os.getenv("TICKET_API_URL", "http://localhost:8089")
+TICKET_API_TOKEN = os.getenv("TICKET_API_TOKEN", "")
+TICKET_TIMEOUT_SECONDS = float(os.getenv("TICKET_TIMEOUT_SECONDS", "10"))
+TICKET_POOL_SIZE = int(os.getenv("TICKET_POOL_SIZE", "20"))
+TICKET_BATCH_WINDOW_MS = int(os.getenv("TICKET_BATCH_WINDOW_MS", "25"))
+TICKET_MAX_BATCH = int(os.getenv("TICKET_MAX_BATCH", "20"))
+TICKET_SIMULATED_LATENCY = float(os.getenv("TICKET_SIMULATED_LATENCY", "1.2"))
+
+# Near-duplicate ticket detection (attach users to a similar open ticket instead of opening a new one)
+TICKET_DEDUP_ENABLED = os.getenv("TICKET_DEDUP_ENABLED", "true").lower() == "true"
+TICKET_DEDUP_THRESHOLD = float(os.getenv("TICKET_DEDUP_THRESHOLD", "0.92"))
+TICKET_DEDUP_TTL_SECONDS = float(os.getenv("TICKET_DEDUP_TTL_SECONDS", "3600"))
+TICKET_DEDUP_PENDING_TTL_SECONDS = float(os.getenv("TICKET_DEDUP_PENDING_TTL_SECONDS", "120"))  # Reservation whose create never finished
+TICKET_DEDUP_MAX_OPEN = int(os.getenv("TICKET_DEDUP_MAX_OPEN", "5000"))
+TICKET_INCIDENT_MIN_CLUSTER = int(os.getenv("TICKET_INCIDENT_MIN_CLUSTER", "5"))
+
 # Governance
 PII_FILTER_ENABLED = True
 LOG_PII_REDACTED = True
+AUDIT_DB_PATH = os.getenv("AUDIT_DB_PATH", "audit_log.db")  # Legacy single-file log, imported into AUDIT_DIR on first use
+
+# Audit Storage (time-partitioned, indexed SQLite files; see audit/store.py)
+AUDIT_DIR = os.getenv("AUDIT_DIR", os.path.join(os.path.dirname(__file__), "audit_logs"))
+AUDIT_PARTITION = os.getenv("AUDIT_PARTITION", "month")  # "month" or "day"
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "730"))  # 0 keeps everything
+AUDIT_PAGE_MAX = int(os.getenv("AUDIT_PAGE_MAX", "10000"))
+
+# Batch Triage (offline backlog processing)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))  # Upper bound for the /chat/batch concurrency field
+BATCH_FLUSH_SIZE = int(os.getenv("BATCH_FLUSH_SIZE", "50"))
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(os.path.dirname(__file__), "batch_jobs"))
+
+# Built-in Tracing (spans exported to rotating local JSONL files, see trace_report.py)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))  # Slow or failed traces are always kept
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(os.path.dirname(__file__), "traces"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+# Startup
+# "background": bind the port immediately and build the graph in the background (/ready reports when warm)
+# "eager": build before accepting traffic; "lazy": build on the first request
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
 
 # LangSmith / Observability
 LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
 LANGCHAIN_PROJECT = "Enterprise_Service_Desk"
 
+# Conversation Compaction
+# Number of most recent messages kept verbatim per thread; older turns are folded into a summary
+MESSAGE_WINDOW = int(os.getenv("MESSAGE_WINDOW", "12"))
+MESSAGE_SUMMARY_MAX_CHARS = int(os.getenv("MESSAGE_SUMMARY_MAX_CHARS", "2000"))
+
+# Planner
+# Stream the plan and dispatch each task to its domain agent as soon as it is parsed
+PLANNER_STREAMING = os.getenv("PLANNER_STREAMING", "true").lower() == "true"
+PLANNER_MAX_PARALLEL = int(os.getenv("PLANNER_MAX_PARALLEL", "3"))
+
 # Confidence Threshold
 CONFIDENCE_THRESHOLD = 0.7
 
@@ -250,6 +250,14 @@ const App = () => {
                             // Auto-infer token event if missing to ensure display
                             if (data.token) currentEvent = 'token';
 
+                            // A retried graph worker restarts the answer: drop the partial tokens
+                            if (currentEvent === 'reset') {
+                                fullContent = "";
+                                isFirstToken = true;
+                                setMessages(prev => prev.map(m => m.id === assistantMsgId ? { ...m, content: "", isPlaceholder: true } : m));
+                                continue;
+                            }
+
                             // Capture Agent Thoughts for Visualizer
                             if (currentEvent === 'agent_thought') {
                                 setAgentThoughts(prev => {
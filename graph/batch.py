@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Iterable, List, Optional
+from langchain_core.messages import HumanMessage
+from audit.store import AuditStore, audit_store
+from graph.escalations import escalations
+from config import BATCH_CONCURRENCY, BATCH_FLUSH_SIZE
+
+def parse_jsonl(lines: Iterable[str], source: str = "input") -> List[dict]:
+    """
+    Parses JSONL lines into dicts. Blank and malformed lines are skipped.
+    """
+    items = []
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            print(f"[BATCH] Skipping malformed line {line_no} in {source}")
+    return items
+
+def read_jsonl(path: str) -> List[dict]:
+    """
+    Loads batch items (or previous results) from a JSONL file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_jsonl(f, path)
+
+def normalize_items(items: Iterable[dict]) -> List[dict]:
+    """
+    Assigns stable ids (line position) to items that don't carry one and drops empty messages.
+    """
+    normalized = []
+    for position, item in enumerate(items):
+        message = (item.get("message") or "").strip()
+        if not message:
+            continue
+        normalized.append({**item, "id": str(item.get("id", position)), "message": message})
+    return normalized
+
+def completed_ids(output_path: Optional[str]) -> set:
+    """
+    Reads ids already finished in a results file. This is the resume checkpoint.
+    Failed items ("status": "error") are not finished: a resumed run retries them and
+    appends a new record, so the last record for an id wins.
+    """
+    if not output_path or not os.path.exists(output_path):
+        return set()
+    return {str(r["id"]) for r in read_jsonl(output_path) if "id" in r and r.get("status") != "error"}
+
+class BatchRunner:
+    """
+    Runs backlogs of requests through the compiled graph for offline triage.
+    - Bounded concurrency via a semaphore around graph.ainvoke.
+    - Results and audit rows are written in bulk every BATCH_FLUSH_SIZE items.
+    - The results file is append-only, so a crashed run resumes by skipping finished ids.
+    """
+    def __init__(self, graph, concurrency: int = BATCH_CONCURRENCY, flush_size: int = BATCH_FLUSH_SIZE, audit: AuditStore = audit_store):
+        self.graph = graph
+        self.concurrency = max(1, concurrency)
+        self.flush_size = max(1, flush_size)
+        self.audit = audit
+
+    async def run(self, items: Iterable[dict], output_path: Optional[str] = None, job_id: str = "batch", on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Processes all items not yet present in output_path.
+        @param items - Dicts with "message" and optional "id", "thread_id", "provider", "model"
+        @param output_path - Results JSONL (also the resume checkpoint); None keeps results in memory only
+        @param job_id - Prefix for generated thread ids
+        @param on_progress - Called with a progress dict after every flush
+        @returns Summary dict with counts and throughput
+        """
+        items = normalize_items(items)
+        done = completed_ids(output_path)
+        pending = [item for item in items if item["id"] not in done]
+        progress = {"job_id": job_id, "total": len(items), "skipped": len(items) - len(pending), "completed": 0, "errors": 0, "escalated": 0}
+        print(f"[BATCH] {job_id}: {len(pending)} to run, {progress['skipped']} already completed.")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        buffer, results = [], []
+        started = time.perf_counter()
+
+        async def worker(item: dict) -> dict:
+            async with semaphore:
+                return await self._run_item(item, job_id)
+
+        for next_result in asyncio.as_completed([worker(item) for item in pending]):
+            result = await next_result
+            buffer.append(result)
+            progress["completed"] += 1
+            progress["errors"] += result["status"] == "error"
+            progress["escalated"] += result["status"] == "escalated"
+            if len(buffer) >= self.flush_size:
+                await self._flush(buffer, output_path, progress, started, on_progress)
+                results.extend(buffer)
+                buffer = []
+
+        await self._flush(buffer, output_path, progress, started, on_progress)
+        results.extend(buffer)
+        if output_path is None:
+            progress["results"] = results
+        return progress
+
+    async def _run_item(self, item: dict, job_id: str) -> dict:
+        # Items may continue a caller's conversation; only threads generated here are throwaway
+        generated = not item.get("thread_id")
+        thread_id = f"{job_id}-{item['id']}" if generated else item["thread_id"]
+        config = {"configurable": {"thread_id": thread_id}}
+        initial_state = {
+            "messages": [HumanMessage(content=item["message"])],
+            "all_responses": [],
+            "config_override": {"provider": item.get("provider"), "model": item.get("model")}
+        }
+        record = {"id": item["id"], "thread_id": thread_id, "message": item["message"], "provider": item.get("provider")}
+        started = time.perf_counter()
+        try:
+            output = await self.graph.ainvoke(initial_state, config)
+            escalated = await escalations.track(self.graph, config)
+            record.update({
+                "status": "escalated" if escalated else "ok",
+                "intent": output.get("intent"),
+                "confidence": output.get("confidence"),
+                "response": output.get("response"),
+                "ticket_id": output.get("ticket_id")
+            })
+            if generated and not escalated:
+                # Finished batch threads are not needed for approval; keep the checkpointer small
+                await self._release_thread(thread_id)
+        except Exception as e:
+            print(f"[BATCH] Item {item['id']} failed: {e}")
+            record.update({"status": "error", "error": str(e)})
+        record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return record
+
+    async def _release_thread(self, thread_id: str):
+        checkpointer = getattr(self.graph, "checkpointer", None)
+        try:
+            if checkpointer is not None:
+                await checkpointer.adelete_thread(thread_id)
+        except Exception:
+            pass
+
+    async def _flush(self, buffer: List[dict], output_path: Optional[str], progress: dict, started: float, on_progress):
+        if buffer:
+            # Disk writes happen off the event loop so the API keeps serving during a batch
+            await asyncio.to_thread(self._persist, buffer, output_path)
+
+        elapsed = time.perf_counter() - started
+        progress["items_per_sec"] = round(progress["completed"] / elapsed, 2) if elapsed > 0 else 0.0
+        print(f"[BATCH] {progress['job_id']}: {progress['completed'] + progress['skipped']}/{progress['total']} "
+              f"({progress['errors']} errors, {progress['escalated']} escalated, {progress['items_per_sec']} items/s)")
+        if on_progress:
+            on_progress(dict(progress))
+
+    def _persist(self, buffer: List[dict], output_path: Optional[str]):
+        # Audit first: a crash between the two writes re-runs items instead of losing audit rows
+        self._write_audit(buffer)
+        if output_path:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r) + "\n" for r in buffer))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_audit(self, records: List[dict]):
+        rows = [r for r in records if r.get("response")]
+        if not rows:
+            return
+        try:
+            self.audit.write_many(rows)
+        except Exception as db_e:
+            print(f"[AUDIT] Failed to write batch logs: {db_e}")
@@ -0,0 +1,293 @@
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Iterable, List, Optional
+from config import ESCALATION_DB_PATH, ESCALATION_RESUME_CONCURRENCY, ESCALATION_CLAIM_TIMEOUT_SECONDS, ESCALATION_PAGE_MAX
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS escalations (
+    thread_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    intent TEXT,
+    confidence REAL,
+    message TEXT,
+    created REAL NOT NULL,
+    claimed_at REAL,
+    resolved_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_esc_status_created ON escalations(status, created, thread_id);
+CREATE INDEX IF NOT EXISTS idx_esc_status_intent ON escalations(status, intent, created, thread_id);
+CREATE INDEX IF NOT EXISTS idx_esc_status_confidence ON escalations(status, COALESCE(confidence, 0), created, thread_id);
+"""
+
+COLUMNS = "thread_id, status, intent, confidence, message, created, claimed_at, resolved_at, attempts, error, result"
+
+# Listing orders: oldest first (age) or least confident first; every key ends in thread_id to stay unique
+SORT_KEYS = {
+    "age": ["created", "thread_id"],
+    "confidence": ["COALESCE(confidence, 0)", "created", "thread_id"]
+}
+
+class EscalationQueue:
+    """
+    Tracks threads paused before the escalation node (interrupt_before) for human review.
+    - register() indexes a paused thread by age, intent and confidence.
+    - list() pages through them for operators (keyset pagination, filters).
+    - approve()/approve_many() resume threads; a claim is a conditional UPDATE on
+      status='pending', so a double-clicked or repeated approve never runs the graph tail twice.
+    Claims of a crashed resume are retried after ESCALATION_CLAIM_TIMEOUT_SECONDS.
+    - Threads whose checkpoint is gone (process-local state lost to a restart, or held by
+      another process) are marked 'orphaned' instead of failing every approve.
+    """
+    def __init__(self, path: str = ESCALATION_DB_PATH, claim_timeout: float = ESCALATION_CLAIM_TIMEOUT_SECONDS):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self._local = threading.local()
+        self._pid = None
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and process; the file is shared by API and graph workers
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        item = dict(row)
+        item["result"] = json.loads(item["result"]) if item["result"] else None
+        item["age_seconds"] = round(time.time() - item["created"], 1)
+        return item
+
+    # --- Registration ---
+
+    def register(self, thread_id: str, intent: Optional[str], confidence: Optional[float], message: Optional[str]):
+        """
+        Records a paused thread as pending. A thread that escalates again on a later turn
+        starts a new pending episode; one already pending keeps its original age.
+        """
+        self._conn().execute("""
+            INSERT INTO escalations (thread_id, status, intent, confidence, message, created)
+            VALUES (?, 'pending', ?, ?, ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET
+                status = 'pending', intent = excluded.intent, confidence = excluded.confidence,
+                message = excluded.message, created = excluded.created, claimed_at = NULL,
+                resolved_at = NULL, attempts = 0, error = NULL, result = NULL
+            WHERE escalations.status NOT IN ('pending', 'resuming')
+        """, (thread_id, intent, confidence, (message or "")[:500], time.time()))
+        print(f"[ESCALATION] Thread {thread_id} queued for review (intent={intent}, confidence={confidence}).")
+
+    def supersede(self, thread_id: str):
+        # The thread moved on (a new turn completed without escalating): its pending review is moot
+        self._conn().execute("UPDATE escalations SET status = 'superseded', resolved_at = ? WHERE thread_id = ? AND status = 'pending'", (time.time(), thread_id))
+
+    async def track(self, graph_app, config: dict) -> bool:
+        """
+        Called after every graph run: registers the thread when the run stopped before the
+        escalation node, otherwise retires any pending review of the thread.
+        @returns Whether the thread is awaiting approval
+        """
+        snapshot = await graph_app.aget_state(config)
+        if "escalation" not in (snapshot.next or ()):
+            await asyncio.to_thread(self.supersede, config["configurable"]["thread_id"])
+            return False
+        values = snapshot.values or {}
+        messages = values.get("messages") or []
+        # The last human message is the Privacy Shield's redacted copy
+        message = next((m.content for m in reversed(messages) if getattr(m, "type", "") == "human"), None)
+        await asyncio.to_thread(self.register, config["configurable"]["thread_id"], values.get("intent"), values.get("confidence"), message)
+        return True
+
+    # --- Listing ---
+
+    @staticmethod
+    def encode_cursor(item: dict, sort: str) -> str:
+        key = [item["created"], item["thread_id"]]
+        if sort == "confidence":
+            key.insert(0, item["confidence"] or 0)
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: str) -> list:
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except Exception:
+            raise ValueError("Invalid escalation cursor")
+        if not isinstance(key, list) or len(key) != len(SORT_KEYS[sort]):
+            raise ValueError("Invalid escalation cursor")
+        return key
+
+    def list(self, status: str = "pending", intent: Optional[str] = None, min_confidence: Optional[float] = None,
+             max_confidence: Optional[float] = None, older_than: Optional[float] = None, sort: str = "age",
+             limit: int = 50, cursor: Optional[str] = None) -> dict:
+        """
+        One page of escalations.
+        @param status - pending | resuming | resolved | superseded | orphaned (None = any)
+        @param intent - Exact intent filter (e.g. "Unknown", "IT")
+        @param min_confidence/max_confidence - Supervisor confidence range (inclusive)
+        @param older_than - Only threads paused at least this many seconds ago
+        @param sort - "age" (oldest first) or "confidence" (least confident first)
+        @param limit - Page size (1..ESCALATION_PAGE_MAX)
+        @param cursor - next_cursor of the previous page
+        @returns {"items": [...], "next_cursor": str or None}
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError("sort must be 'age' or 'confidence'")
+        if not 1 <= limit <= ESCALATION_PAGE_MAX:
+            raise ValueError(f"limit must be between 1 and {ESCALATION_PAGE_MAX}")
+
+        where, params = [], []
+        if status:
+            where.append("status = ?"); params.append(status)
+        if intent:
+            where.append("intent = ?"); params.append(intent)
+        if min_confidence is not None:
+            where.append("COALESCE(confidence, 0) >= ?"); params.append(min_confidence)
+        if max_confidence is not None:
+            where.append("COALESCE(confidence, 0) <= ?"); params.append(max_confidence)
+        if older_than is not None:
+            where.append("created <= ?"); params.append(time.time() - older_than)
+        key = SORT_KEYS[sort]
+        if cursor:
+            where.append(f"({', '.join(key)}) > ({', '.join('?' * len(key))})")
+            params.extend(self.decode_cursor(cursor, sort))
+
+        sql = f"SELECT {COLUMNS} FROM escalations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {', '.join(key)} LIMIT ?"
+        items = [self._row(r) for r in self._conn().execute(sql, params + [limit])]
+        next_cursor = self.encode_cursor(items[-1], sort) if len(items) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get(self, thread_id: str) -> Optional[dict]:
+        row = self._conn().execute(f"SELECT {COLUMNS} FROM escalations WHERE thread_id = ?", (thread_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def counts(self) -> dict:
+        """
+        Escalations by status and, for pending ones, by intent.
+        """
+        conn = self._conn()
+        by_status = {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM escalations GROUP BY status")}
+        by_intent = {r["intent"] or "none": r["n"] for r in conn.execute("SELECT intent, COUNT(*) AS n FROM escalations WHERE status = 'pending' GROUP BY intent")}
+        oldest = conn.execute("SELECT MIN(created) FROM escalations WHERE status = 'pending'").fetchone()[0]
+        return {"by_status": by_status, "pending_by_intent": by_intent, "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None}
+
+    # --- Resuming ---
+
+    def claim(self, thread_id: str) -> bool:
+        """
+        Atomically moves a pending thread to 'resuming'. Only one caller can win.
+        """
+        now = time.time()
+        cur = self._conn().execute("""
+            UPDATE escalations SET status = 'resuming', claimed_at = ?, attempts = attempts + 1
+            WHERE thread_id = ? AND (status = 'pending' OR (status = 'resuming' AND claimed_at < ?))
+        """, (now, thread_id, now - self.claim_timeout))
+        return cur.rowcount == 1
+
+    def resolve(self, thread_id: str, result: dict):
+        self._conn().execute(
+            "UPDATE escalations SET status = 'resolved', resolved_at = ?, error = NULL, result = ? WHERE thread_id = ? AND status = 'resuming'",
+            (time.time(), json.dumps(result), thread_id)
+        )
+
+    def orphan(self, thread_id: str) -> bool:
+        """
+        Retires an approvable thread that has no paused checkpoint left to resume.
+        @returns Whether the row was pending (or a stale claim) and is now orphaned
+        """
+        now = time.time()
+        cur = self._conn().execute("""
+            UPDATE escalations SET status = 'orphaned', resolved_at = ?, claimed_at = NULL, error = 'No paused checkpoint for this thread'
+            WHERE thread_id = ? AND (status = 'pending' OR (status = 'resuming' AND claimed_at < ?))
+        """, (now, thread_id, now - self.claim_timeout))
+        return cur.rowcount == 1
+
+    def release(self, thread_id: str, error: str):
+        # A failed resume goes back to the queue so it can be approved again
+        self._conn().execute(
+            "UPDATE escalations SET status = 'pending', claimed_at = NULL, error = ? WHERE thread_id = ? AND status = 'resuming'",
+            (error, thread_id)
+        )
+
+    async def approve(self, thread_id: str, resume: Callable[[str], Awaitable[dict]],
+                      paused: Optional[Callable[[str], Awaitable[bool]]] = None) -> dict:
+        """
+        Resumes one escalated thread at most once.
+        @param thread_id - Paused thread
+        @param resume - Coroutine running the graph tail for a thread; returns its final output
+        @param paused - Optional check that the thread still has a checkpoint paused before escalation
+        @returns Compact result: {"thread_id", "status", "response"?, "ticket_id"?, "error"?};
+                 status is resumed | already_resumed | in_progress | not_found | orphaned | failed
+        """
+        if paused is not None and not await paused(thread_id):
+            if await asyncio.to_thread(self.orphan, thread_id):
+                print(f"[ESCALATION] Thread {thread_id} has no paused checkpoint; marked orphaned.")
+                return {"thread_id": thread_id, "status": "orphaned"}
+
+        if not await asyncio.to_thread(self.claim, thread_id):
+            current = await asyncio.to_thread(self.get, thread_id)
+            if current is None:
+                return {"thread_id": thread_id, "status": "not_found"}
+            if current["status"] == "resolved":
+                return {"thread_id": thread_id, "status": "already_resumed", **(current["result"] or {})}
+            if current["status"] == "orphaned":
+                return {"thread_id": thread_id, "status": "orphaned"}
+            return {"thread_id": thread_id, "status": "in_progress"}
+
+        try:
+            output = await resume(thread_id)
+        except Exception as e:
+            print(f"[ESCALATION] Resume of {thread_id} failed: {e}")
+            await asyncio.to_thread(self.release, thread_id, str(e))
+            return {"thread_id": thread_id, "status": "failed", "error": str(e)}
+
+        result = {"response": (output or {}).get("response"), "ticket_id": (output or {}).get("ticket_id")}
+        await asyncio.to_thread(self.resolve, thread_id, result)
+        return {"thread_id": thread_id, "status": "resumed", **result}
+
+    async def approve_many(self, thread_ids: Iterable[str], resume: Callable[[str], Awaitable[dict]],
+                           concurrency: int = ESCALATION_RESUME_CONCURRENCY,
+                           paused: Optional[Callable[[str], Awaitable[bool]]] = None) -> AsyncGenerator[dict, None]:
+        """
+        Resumes many threads with bounded parallelism, yielding each result as it completes.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(thread_id: str) -> dict:
+            async with semaphore:
+                return await self.approve(thread_id, resume, paused)
+
+        for done in asyncio.as_completed([one(t) for t in dict.fromkeys(thread_ids)]):
+            yield await done
+
+    def pending_ids(self, intent: Optional[str] = None, max_confidence: Optional[float] = None,
+                    older_than: Optional[float] = None, limit: int = ESCALATION_PAGE_MAX) -> List[str]:
+        """
+        Thread ids matching a bulk-approve filter, oldest first.
+        """
+        page = self.list(intent=intent, max_confidence=max_confidence, older_than=older_than, limit=limit)
+        return [item["thread_id"] for item in page["items"]]
+
+# Shared instance (the database is only opened on first use)
+escalations = EscalationQueue()
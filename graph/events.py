@@ -0,0 +1,73 @@
+import json
+from typing import AsyncGenerator, Optional
+
+# Nodes whose outputs are streamed to the UI as "agent_thought" events
+AGENT_NODES = ["supervisor", "planner", "it", "hr", "finance", "privacy_shield", "consume_task"]
+
+def serialize_output(obj):
+    if hasattr(obj, "dict"): return obj.dict()
+    if hasattr(obj, "to_json"): return obj.to_json()
+    if isinstance(obj, (list, tuple)): return [serialize_output(x) for x in obj]
+    if isinstance(obj, dict): return {k: serialize_output(v) for k, v in obj.items()}
+    if hasattr(obj, "content"): return obj.content # Handle LangChain Messages
+    return str(obj)
+
+def final_response(output: dict) -> dict:
+    """
+    The "final_response" SSE payload for a finished turn's graph output (or checkpointed values).
+    """
+    return {"event": "final_response", "data": json.dumps({
+        "response": output["response"],
+        "ticket_id": output.get("ticket_id"),
+        "escalation": output.get("escalation")
+    })}
+
+def translate_event(event: dict) -> Optional[dict]:
+    """
+    Maps one astream_events (v2) event to the SSE payload /chat streams, if any.
+    Shared by the in-process API and the graph workers, so both modes emit identical streams.
+    @param event - Raw LangGraph event
+    @returns {"event": name, "data": JSON string}, or None for events the UI does not consume
+    """
+    kind = event.get("event")
+    name = event.get("name")
+
+    # 1. Node Start/End Updates
+    if kind == "on_node_start":
+        return {"event": "node_update", "data": json.dumps({"node": name, "status": "active"})}
+
+    # 2. Token Streaming (from LLM calls within nodes)
+    if kind == "on_chat_model_stream":
+        content = event["data"]["chunk"].content
+        if content:
+            return {"event": "token", "data": json.dumps({"token": content})}
+        return None
+
+    if kind != "on_chain_end":
+        return None
+
+    # 3. Agent Thought/Decision Capture (Node Outputs)
+    if name in AGENT_NODES:
+        return {"event": "agent_thought", "data": json.dumps({
+            "node": name,
+            "output": serialize_output(event.get("data", {}).get("output")),
+            "status": "completed"
+        })}
+
+    # 4. Final Graph Output (Metadata & Token Consolidation)
+    if name == "LangGraph":
+        output = event.get("data", {}).get("output")
+        if isinstance(output, dict) and "response" in output:
+            # ALWAYS emit final response to ensure frontend state (streaming=false) resolves correctly
+            return final_response(output)
+    return None
+
+async def stream_graph(graph_app, state: Optional[dict], config: dict) -> AsyncGenerator[dict, None]:
+    """
+    Runs the graph (state=None resumes an interrupted thread) and yields its SSE payloads.
+    """
+    # Using astream_events v2 for granular token streaming
+    async for event in graph_app.astream_events(state, config, version="v2"):
+        sse = translate_event(event)
+        if sse is not None:
+            yield sse
@@ -0,0 +1,391 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import AsyncGenerator, Dict, List, Optional
+from config import (
+    JOB_QUEUE_BACKEND, JOB_QUEUE_PATH, JOB_POLL_INTERVAL_MS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS,
+    JOB_RETENTION_SECONDS, JOB_CLAIM_TIMEOUT_SECONDS, JOB_RELAY_TIMEOUT_SECONDS
+)
+
+# Stream terminator written together with the job's final status (never relayed to clients)
+END_EVENT = "job_end"
+# Published by a retried attempt: output streamed by earlier attempts is void (relayed as "reset")
+RESET_EVENT = "job_reset"
+
+class EventPoller:
+    """
+    Polls the event streams of every job relayed by this process with one events_many()
+    query per tick (one worker thread hop, however many clients are streaming) and hands
+    the rows to each relay through its own asyncio.Queue. Runs only while relays are subscribed.
+    """
+    def __init__(self, queue: "JobQueue", interval: float):
+        self.queue = queue
+        self.interval = interval
+        self._subscribers: Dict[str, list] = {}  # job_id -> [last seq, asyncio.Queue]
+        self._task = None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        inbox = asyncio.Queue()
+        self._subscribers[job_id] = [0, inbox]
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+        return inbox
+
+    def unsubscribe(self, job_id: str):
+        self._subscribers.pop(job_id, None)
+
+    async def _run(self):
+        while self._subscribers:
+            cursors = {job_id: sub[0] for job_id, sub in self._subscribers.items()}
+            try:
+                batches = await asyncio.to_thread(self.queue.events_many, cursors)
+            except Exception as e:
+                print(f"[RECOVER] Job event poll failed: {e}")
+                batches = {}
+            for job_id, rows in batches.items():
+                sub = self._subscribers.get(job_id)
+                if sub is None or not rows:
+                    continue
+                sub[0] = rows[-1]["seq"]
+                for row in rows:
+                    sub[1].put_nowait(row)
+            if not any(batches.values()):
+                await asyncio.sleep(self.interval)
+
+class JobQueue(ABC):
+    """
+    Interface between API front-ends and graph workers.
+    - Front-ends submit() jobs and relay() their event stream.
+    - Workers claim() jobs, renew() their lease, publish() translated SSE events and finish() them.
+    A networked backend (Redis streams, NATS, ...) implements the same methods to span nodes.
+    """
+    @abstractmethod
+    def submit(self, kind: str, payload: dict, thread_id: Optional[str] = None) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self, worker: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def renew(self, job_id: str, worker: str) -> bool:
+        ...
+
+    @abstractmethod
+    def publish(self, job_id: str, events: List[dict]):
+        ...
+
+    @abstractmethod
+    def finish(self, job_id: str, error: Optional[str] = None, result: Optional[dict] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def events(self, job_id: str, after: int = 0) -> List[dict]:
+        ...
+
+    def events_many(self, cursors: Dict[str, int]) -> Dict[str, List[dict]]:
+        """
+        events() for several jobs at once ({job_id: after seq}); backends override it with one query.
+        """
+        return {job_id: self.events(job_id, after) for job_id, after in cursors.items()}
+
+    @abstractmethod
+    def status(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def purge(self, older_than: float = JOB_RETENTION_SECONDS) -> int:
+        ...
+
+    @abstractmethod
+    def depth(self) -> dict:
+        ...
+
+    def _poller(self, poll_interval: float) -> EventPoller:
+        poller = getattr(self, "_event_poller", None)
+        if poller is None:
+            poller = self._event_poller = EventPoller(self, poll_interval)
+        return poller
+
+    async def relay(self, job_id: str, poll_interval: float = JOB_POLL_INTERVAL_MS / 1000,
+                    claim_timeout: float = JOB_CLAIM_TIMEOUT_SECONDS, timeout: float = JOB_RELAY_TIMEOUT_SECONDS) -> AsyncGenerator[dict, None]:
+        """
+        Yields a job's events as they are published, until the worker finishes it.
+        A failed job ends with an "error" event, like the in-process stream. When a worker
+        retries the job, a "reset" event tells the client to drop the partial answer so far.
+        A job no worker claimed within claim_timeout, or that has not finished within timeout,
+        is failed here (its worker loses the lease and stops), which ends the stream with an error.
+        """
+        inbox = self._poller(poll_interval).subscribe(job_id)
+        started = time.monotonic()
+        claimed = expired = False
+        try:
+            while True:
+                wait = None
+                if not expired:
+                    wait = max(0.0, started + (timeout if claimed else min(claim_timeout, timeout)) - time.monotonic())
+                try:
+                    row = await asyncio.wait_for(inbox.get(), timeout=wait)
+                except asyncio.TimeoutError:
+                    job = await asyncio.to_thread(self.status, job_id)
+                    if job is None:
+                        yield {"event": "error", "data": f"Unknown job {job_id}"}
+                        return
+                    if job["status"] == "queued":
+                        await asyncio.to_thread(self.finish, job_id, f"No graph worker claimed the job within {claim_timeout:g}s")
+                    elif job["status"] == "running" and time.monotonic() - started >= timeout:
+                        await asyncio.to_thread(self.finish, job_id, f"Job did not finish within {timeout:g}s")
+                    elif job["status"] == "running":
+                        # Claimed but silent so far: wait for the overall deadline
+                        claimed = True
+                        continue
+                    # Finished (here or by its worker): its end event is on the way
+                    expired = True
+                    continue
+                claimed = True
+                if row["event"] == END_EVENT:
+                    end = json.loads(row["data"])
+                    if end.get("error"):
+                        yield {"event": "error", "data": end["error"]}
+                    return
+                if row["event"] == RESET_EVENT:
+                    yield {"event": "reset", "data": row["data"]}
+                    continue
+                yield {"event": row["event"], "data": row["data"]}
+        finally:
+            self._poller(poll_interval).unsubscribe(job_id)
+
+class SqliteJobQueue(JobQueue):
+    """
+    Local job queue in one SQLite file (WAL), shared by every API and worker process on the host.
+    - claim() is a single UPDATE ... RETURNING, so concurrent workers never take the same job.
+    - Workers hold a lease, renewed by a heartbeat and as they publish; jobs of a crashed worker
+      are re-queued once the lease expires (up to JOB_MAX_ATTEMPTS runs).
+    - Events are rows keyed by (job_id, seq); front-ends poll them after the last seq they relayed,
+      all relayed jobs of a process in one query.
+    """
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_seconds: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._pid = None
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread (and per process: connections must not cross a fork)
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._ensure_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                thread_id TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                next_seq INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created);
+            CREATE TABLE IF NOT EXISTS events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            ) WITHOUT ROWID;
+        """)
+
+    def submit(self, kind: str, payload: dict, thread_id: Optional[str] = None) -> str:
+        """
+        Enqueues a job.
+        @param kind - "chat" (new message) or "resume" (continue an interrupted thread)
+        @param payload - JSON-serializable job arguments
+        @returns Job id
+        """
+        job_id = str(uuid.uuid4())
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, thread_id, payload, created) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, thread_id, json.dumps(payload), time.time())
+        )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """
+        Takes the oldest queued job (or one whose worker's lease expired).
+        @returns {"id", "kind", "thread_id", "payload", "attempts"} or None when the queue is empty
+        """
+        now = time.time()
+        conn = self._conn()
+        # Jobs whose worker died too often are failed instead of re-queued
+        self._fail_abandoned(conn, now)
+        row = conn.execute("""
+            UPDATE jobs SET status = 'running', worker = ?, started = ?, lease_until = ?, attempts = attempts + 1
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_until < ? AND attempts < ?)
+                ORDER BY created LIMIT 1
+            )
+            RETURNING id, kind, thread_id, payload, attempts
+        """, (worker, now, now + self.lease_seconds, now, self.max_attempts)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """
+        Extends a running job's lease (worker heartbeat).
+        @returns False when the job is no longer this worker's (lease expired and re-claimed, or finished)
+        """
+        row = self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running' RETURNING id",
+            (time.time() + self.lease_seconds, job_id, worker)
+        ).fetchone()
+        return row is not None
+
+    def _fail_abandoned(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, self.max_attempts)
+        ).fetchall()
+        for row in expired:
+            self.finish(row["id"], error=f"Job abandoned by its worker after {self.max_attempts} attempts")
+
+    def publish(self, job_id: str, events: List[dict]):
+        """
+        Appends SSE payloads ({"event", "data"}) to a job's stream in one transaction
+        and renews the worker's lease.
+        """
+        if not events:
+            return
+        with self._transaction() as conn:
+            self._append(conn, job_id, events)
+
+    def finish(self, job_id: str, error: Optional[str] = None, result: Optional[dict] = None) -> bool:
+        """
+        Marks a job done/failed and terminates its event stream (atomically).
+        @returns False if the job was already finished (e.g. failed by a relay timeout); nothing changes then
+        """
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM jobs WHERE id = ? AND status IN ('queued', 'running')", (job_id,)).fetchone() is None:
+                return False
+            self._append(conn, job_id, [{"event": END_EVENT, "data": json.dumps({"error": error})}])
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ?, result = ?, lease_until = NULL WHERE id = ?",
+                ("failed" if error else "done", time.time(), error, json.dumps(result) if result is not None else None, job_id)
+            )
+        return True
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _append(self, conn: sqlite3.Connection, job_id: str, events: List[dict]):
+        next_seq = conn.execute(
+            "UPDATE jobs SET next_seq = next_seq + ?, lease_until = ? WHERE id = ? RETURNING next_seq",
+            (len(events), time.time() + self.lease_seconds, job_id)
+        ).fetchone()[0]
+        first = next_seq - len(events)
+        conn.executemany(
+            "INSERT INTO events (job_id, seq, event, data) VALUES (?, ?, ?, ?)",
+            [(job_id, first + i, e["event"], e["data"]) for i, e in enumerate(events)]
+        )
+
+    def events(self, job_id: str, after: int = 0) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT seq, event, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def events_many(self, cursors: Dict[str, int]) -> Dict[str, List[dict]]:
+        if not cursors:
+            return {}
+        # One range per job on the (job_id, seq) primary key
+        clauses = " OR ".join("(job_id = ? AND seq > ?)" for _ in cursors)
+        params = [v for item in cursors.items() for v in item]
+        batches = {job_id: [] for job_id in cursors}
+        for r in self._conn().execute(f"SELECT job_id, seq, event, data FROM events WHERE {clauses} ORDER BY job_id, seq", params):
+            batches[r["job_id"]].append({"seq": r["seq"], "event": r["event"], "data": r["data"]})
+        return batches
+
+    def status(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT id, kind, thread_id, status, created, started, finished, worker, attempts, error, result FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def purge(self, older_than: float = JOB_RETENTION_SECONDS) -> int:
+        """
+        Deletes finished jobs (and their events) older than `older_than` seconds.
+        """
+        cutoff = time.time() - older_than
+        conn = self._conn()
+        ids = [r["id"] for r in conn.execute("SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?", (cutoff,))]
+        for job_id in ids:
+            conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return len(ids)
+
+    def depth(self) -> dict:
+        """
+        Job counts by status (queue depth for autoscaling workers).
+        """
+        return {r["status"]: r["n"] for r in self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+def get_job_queue(kind: str = JOB_QUEUE_BACKEND) -> JobQueue:
+    """
+    Returns the configured job queue backend (only the local "sqlite" backend ships in-tree).
+    """
+    if kind != "sqlite":
+        raise ValueError(f"Unknown job queue backend: {kind}")
+    return SqliteJobQueue()
+
+# Shared instance (the database is only opened on first use)
+job_queue = get_job_queue()
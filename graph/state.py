@@ -1,13 +1,29 @@
-from typing import List, Optional, TypedDict, Annotated
+from typing import Dict, List, Optional, TypedDict, Annotated
 from langchain_core.messages import BaseMessage
-import operator
+from langgraph.graph.message import add_messages
+
+def add_or_reset(left: Optional[List[str]], right: Optional[List[str]]) -> List[str]:
+    """
+    Appends like operator.add, but an explicit None update clears the list.
+    Lets the compaction node reset per-turn accumulators between turns.
+    """
+    if right is None:
+        return []
+    return (left or []) + right
+
+def merge_retrieval(left: Optional[Dict[str, dict]], right: Optional[Dict[str, dict]]) -> Dict[str, dict]:
+    """
+    Per-domain merge of retrieval working sets: an update replaces only the domains it contains.
+    """
+    return {**(left or {}), **(right or {})}
 
 class AgentState(TypedDict):
     """
     State definition for the LangGraph workflow.
     Ensures data persistence and communication between agent nodes.
     """
-    messages: Annotated[List[BaseMessage], operator.add]
+    # add_messages (instead of operator.add) lets compaction remove/replace messages by id
+    messages: Annotated[List[BaseMessage], add_messages]
     intent: Optional[str]
     confidence: Optional[float]
     tasks: Optional[List[str]]
@@ -15,4 +31,6 @@ class AgentState(TypedDict):
     ticket_id: Optional[str]
     response: Optional[str]
     escalation: Optional[bool]
-    all_responses: Annotated[List[str], operator.add] # Used to merge multi-intent results
+    all_responses: Annotated[List[str], add_or_reset] # Used to merge multi-intent results, reset every turn
+    # {domain: {"query", "chunks": [[chunk_id, score], ...], "top_score"}} reused by follow-up turns
+    retrieval: Annotated[Dict[str, dict], merge_retrieval]
@@ -1,5 +1,8 @@
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from graph.state import AgentState
 from agents.supervisor import SupervisorAgent
 from agents.hr_agent import HRAgent
@@ -7,19 +10,52 @@ from agents.it_agent import ITAgent
 from agents.finance_agent import FinanceAgent
 from agents.planner import PlannerAgent
 from agents.governance import GovernanceAgent
-from config import CONFIDENCE_THRESHOLD
+from rag.prefetch import prefetcher
+from rag.working_set import covers
+from startup import startup_timer
+from config import CONFIDENCE_THRESHOLD, MESSAGE_WINDOW, MESSAGE_SUMMARY_MAX_CHARS, RETRIEVAL_PREFETCH
 import sqlite3
+import threading
 
 # Initializing In-Memory Persistence (Stable)
 memory = MemorySaver()
+# Process-wide override installed by use_checkpointer() (the API's shared SQLite saver)
+_checkpointer = None
 
-# Initialize Agents
-governance = GovernanceAgent()
-supervisor = SupervisorAgent()
-hr_agent = HRAgent()
-it_agent = ITAgent()
-finance_agent = FinanceAgent()
-planner = PlannerAgent()
+# Agents are created by init_agents() on first use: building the domain RAG indexes
+# dominates startup, so importing this module stays cheap
+governance = supervisor = hr_agent = it_agent = finance_agent = planner = None
+_app = None
+_init_lock = threading.RLock()
+
+def init_agents():
+    """
+    Builds the agent singletons (and their vector stores) once, timing each as a startup phase.
+    """
+    global governance, supervisor, hr_agent, it_agent, finance_agent, planner
+    with _init_lock:
+        if planner is not None:
+            return
+        with startup_timer.phase("agents.governance"):
+            governance = GovernanceAgent()
+        with startup_timer.phase("agents.supervisor"):
+            supervisor = SupervisorAgent()
+        with startup_timer.phase("agents.hr"):
+            hr_agent = HRAgent()
+        with startup_timer.phase("agents.it"):
+            it_agent = ITAgent()
+        with startup_timer.phase("agents.finance"):
+            finance_agent = FinanceAgent()
+        # Domains searched speculatively while the Supervisor classifies
+        for agent in (hr_agent, it_agent, finance_agent):
+            prefetcher.register(agent.vector_store)
+
+        # The planner dispatches streamed tasks straight to the domain agents (same runnables as their nodes)
+        planner = PlannerAgent(executors={
+            "HR": RunnableLambda(hr_agent.execute, name="hr"),
+            "IT": RunnableLambda(it_agent.execute, afunc=it_agent.aexecute, name="it"),
+            "Finance": RunnableLambda(finance_agent.execute, name="finance")
+        })
 
 def human_escalation(state: AgentState) -> dict:
     """
@@ -34,6 +70,84 @@ def human_escalation(state: AgentState) -> dict:
         "all_responses": [f"System: {msg}"]
     }
 
+SUMMARY_MESSAGE_ID = "conversation_summary"
+
+def compact_conversation(state: AgentState) -> dict:
+    """
+    Bounds per-thread state growth before the turn is routed.
+    1. Drops unredacted originals once the Privacy Shield copy exists.
+    2. Folds messages outside MESSAGE_WINDOW into a single truncated summary message.
+    3. Resets all_responses so merged output only covers the current turn.
+    """
+    messages = state.get("messages", [])
+    redacted_ids = {m.additional_kwargs.get("redacted_from") for m in messages if m.additional_kwargs.get("redacted_from")}
+
+    previous_summary = None
+    kept = []
+    for m in messages:
+        if m.id == SUMMARY_MESSAGE_ID:
+            previous_summary = m
+        elif m.id not in redacted_ids:
+            kept.append(m)
+
+    dropped = kept[:-MESSAGE_WINDOW] if len(kept) > MESSAGE_WINDOW else []
+    kept = kept[len(dropped):]
+
+    # Nothing to compact: avoid rewriting the message channel at all
+    if not dropped and len(kept) + (previous_summary is not None) == len(messages):
+        return {"all_responses": None}
+
+    summary = previous_summary
+    if dropped:
+        lines = previous_summary.content.splitlines()[1:] if previous_summary else []
+        for m in dropped:
+            role = "User" if isinstance(m, HumanMessage) else m.type.capitalize()
+            text = " ".join(str(m.content).split())
+            lines.append(f"- {role}: {text[:160]}")
+        # Keep the most recent lines that fit into the summary budget
+        budget, tail = MESSAGE_SUMMARY_MAX_CHARS, []
+        for line in reversed(lines):
+            budget -= len(line) + 1
+            if budget < 0:
+                break
+            tail.append(line)
+        content = "Earlier conversation (compacted):\n" + "\n".join(reversed(tail))
+        summary = SystemMessage(content=content, id=SUMMARY_MESSAGE_ID)
+
+    print(f"[NODE] Compaction: kept {len(kept)} messages, folded {len(dropped)} into summary.")
+    rewritten = ([summary] if summary else []) + kept
+    return {
+        "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + rewritten,
+        "all_responses": None
+    }
+
+def prefetch_retrieval(state: AgentState) -> dict:
+    """
+    Starts cross-domain retrieval for the redacted query in the background.
+    Runs in the same superstep as the Supervisor so RAG latency hides behind classification.
+    Skipped for follow-ups a domain working set already covers: that agent will not search.
+    """
+    query = state['messages'][-1].content
+    if any(covers(previous, query) for previous in (state.get("retrieval") or {}).values()):
+        print("[RAG] Prefetch skipped: follow-up covered by the retrieval working set.")
+        return {}
+    prefetcher.start(query)
+    return {}
+
+def end_turn(state: AgentState):
+    """
+    Releases per-turn resources when the turn's last node runs (merge, or the pause before escalation).
+    """
+    if RETRIEVAL_PREFETCH and state.get("messages"):
+        prefetcher.finish_turn(state['messages'][-1].content)
+
+def close_turn(state: AgentState) -> dict:
+    """
+    Last node before the escalation interrupt: the run pauses here, so the turn ends now.
+    """
+    end_turn(state)
+    return {}
+
 def consume_task(state: AgentState) -> dict:
     """
     Consumes the first task from the list and prepares state for it.
@@ -59,6 +173,7 @@ def merge_responses(state: AgentState) -> dict:
     """
     all_res = state.get("all_responses", [])
     final_response = "\n\n".join(all_res)
+    end_turn(state)
     print(f"[NODE] Merged final response.")
     return {"response": final_response}
 
@@ -95,29 +210,42 @@ def next_step_router(state: AgentState):
         return state.get("intent").lower()
     return "merge"
 
-def build_workflow():
+def build_workflow(checkpointer=None):
     """
     Updated LangGraph workflow with:
     1. Privacy Shield (PII Filtering)
-    2. Persistence (SqliteSaver)
-    3. Human-In-The-Loop (Interrupts)
+    2. Conversation Compaction (bounded checkpoints)
+    3. Persistence (in-memory by default; graph workers and CHECKPOINT_BACKEND=sqlite use a shared AsyncSqliteSaver)
+    4. Human-In-The-Loop (Interrupts)
+    @param checkpointer - Checkpoint saver to compile with (defaults to use_checkpointer()'s, else the process-local MemorySaver)
     """
+    init_agents()
     workflow = StateGraph(AgentState)
 
     # Define Nodes
     workflow.add_node("privacy_shield", governance.filter_pii)
+    workflow.add_node("compact", compact_conversation)
     workflow.add_node("supervisor", supervisor.classify)
     workflow.add_node("hr", hr_agent.execute)
-    workflow.add_node("it", it_agent.execute)
+    # Sync + async implementations: async runs keep the ticketing round trip off the event loop
+    workflow.add_node("it", RunnableLambda(it_agent.execute, afunc=it_agent.aexecute))
     workflow.add_node("finance", finance_agent.execute)
-    workflow.add_node("planner", planner.plan)
+    workflow.add_node("planner", RunnableLambda(planner.plan, afunc=planner.aplan))
     workflow.add_node("consume_task", consume_task)
+    workflow.add_node("close_turn", close_turn)
     workflow.add_node("escalation", human_escalation)
     workflow.add_node("merge", merge_responses)
 
     # Define Connectivity
     workflow.set_entry_point("privacy_shield")
-    workflow.add_edge("privacy_shield", "supervisor")
+    workflow.add_edge("privacy_shield", "compact")
+    workflow.add_edge("compact", "supervisor")
+
+    # Optional speculative retrieval branch (no outgoing edge: results are consumed by the agents)
+    if RETRIEVAL_PREFETCH:
+        workflow.add_node("prefetch", prefetch_retrieval)
+        workflow.add_edge("compact", "prefetch")
+        workflow.add_edge("prefetch", END)
 
     # Routing from supervisor
     workflow.add_conditional_edges(
@@ -128,7 +256,7 @@ def build_workflow():
             "it": "it",
             "finance": "finance",
             "planner": "planner",
-            "escalation": "escalation",
+            "escalation": "close_turn",
             "finish": "merge"
         }
     )
@@ -149,26 +277,48 @@ def build_workflow():
     )
 
     def planner_routing(state: AgentState):
-        intent = state.get("intent", "").lower()
-        if intent in ["hr", "it", "finance"]:
-            return intent
+        # Sequential plan: hand the first task to its agent
+        if state.get("tasks"):
+            intent = (state.get("intent") or "").lower()
+            if intent in ["hr", "it", "finance"]:
+                return intent
+        # Streaming plan: tasks were already executed during planning
+        elif state.get("all_responses"):
+            return "merge"
         return "escalation"
     
-    workflow.add_conditional_edges("planner", planner_routing, {"hr": "hr", "it": "it", "finance": "finance"})
+    workflow.add_conditional_edges(
+        "planner",
+        planner_routing,
+        {"hr": "hr", "it": "it", "finance": "finance", "merge": "merge", "escalation": "close_turn"}
+    )
 
+    workflow.add_edge("close_turn", "escalation")
     workflow.add_edge("merge", END)
     workflow.add_edge("escalation", END)
 
     # Compile with checkpointer and human-in-the-loop interrupt
     return workflow.compile(
-        checkpointer=memory,
+        checkpointer=checkpointer or _checkpointer or memory,
         interrupt_before=["escalation"]
     )
 
+def use_checkpointer(saver):
+    """
+    Sets the checkpoint saver of this process's graph, including a graph already compiled
+    (preforked workers inherit the parent's, built before the serving event loop existed).
+    """
+    global _checkpointer
+    with _init_lock:
+        _checkpointer = saver
+        if _app is not None:
+            _app.checkpointer = saver
+
 def reindex_domain(domain: str):
     """
     Manually triggers a re-indexing of a domain's vector store.
     """
+    init_agents()
     if domain.upper() == "IT":
         it_agent.vector_store.initialize_store()
     elif domain.upper() == "HR":
@@ -177,5 +327,24 @@ def reindex_domain(domain: str):
         finance_agent.vector_store.initialize_store()
     print(f"[SYSTEM] Re-indexed {domain} domain.")
 
-# Singleton app instance
-app = build_workflow()
+def get_app():
+    """
+    Returns the compiled graph singleton, building agents and graph on the first call.
+    """
+    global _app
+    if _app is None:
+        with _init_lock:
+            if _app is None:
+                init_agents()
+                with startup_timer.phase("graph.compile"):
+                    _app = build_workflow()
+    return _app
+
+def is_built() -> bool:
+    return _app is not None
+
+def __getattr__(name: str):
+    # `from graph.workflow import app` keeps working for scripts; it builds the graph on access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
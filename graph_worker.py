@@ -0,0 +1,261 @@
+from langchain_core.messages import HumanMessage
+from graph.workflow import build_workflow, init_agents
+from graph.events import final_response, stream_graph
+from graph.job_queue import RESET_EVENT, job_queue
+from graph.escalations import escalations
+from tracing import tracer
+from config import (
+    CHECKPOINT_DB_PATH, GRAPH_WORKER_PROCESSES, GRAPH_WORKER_CONCURRENCY, JOB_POLL_INTERVAL_MS,
+    JOB_EVENT_FLUSH_MS, JOB_LEASE_SECONDS, JOB_RETENTION_SECONDS
+)
+from typing import List, Optional
+import multiprocessing
+import multiprocessing.connection
+import argparse
+import asyncio
+import signal
+import socket
+import json
+import time
+import os
+
+class EventPublisher:
+    """
+    Buffers a job's SSE events and publishes them in small batches: tokens are flushed every
+    JOB_EVENT_FLUSH_MS, every other event (node updates, final response) immediately.
+    """
+    def __init__(self, job_id: str, flush_ms: int = JOB_EVENT_FLUSH_MS):
+        self.job_id = job_id
+        self.flush_interval = flush_ms / 1000
+        self._buffer: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._ticker = None
+
+    async def emit(self, sse: dict):
+        self._buffer.append(sse)
+        if sse["event"] != "token":
+            await self.flush()
+        elif self._ticker is None:
+            self._ticker = asyncio.create_task(self._tick())
+
+    async def _tick(self):
+        await asyncio.sleep(self.flush_interval)
+        self._ticker = None
+        await self.flush()
+
+    async def flush(self):
+        # The lock keeps batches in order when a timed flush and an immediate one overlap
+        async with self._lock:
+            batch, self._buffer = self._buffer, []
+            if batch:
+                await asyncio.to_thread(job_queue.publish, self.job_id, batch)
+
+    async def close(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        await self.flush()
+
+async def heartbeat(job_id: str, worker_id: str, runner: asyncio.Task, interval: float = JOB_LEASE_SECONDS / 3):
+    """
+    Renews a job's lease while it runs, independently of publishing (a node may stay silent
+    for longer than the lease). If another worker took the job over, the run is cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            owned = await asyncio.to_thread(job_queue.renew, job_id, worker_id)
+        except Exception as e:
+            print(f"[RECOVER] Lease renewal for job {job_id} failed: {e}")
+            continue
+        if not owned:
+            print(f"[RECOVER] Job {job_id} lease lost; cancelling this attempt.")
+            runner.cancel()
+            return
+
+async def retry_state(graph_app, job: dict, config: dict, state: Optional[dict]):
+    """
+    Where a crashed earlier attempt left a chat job's turn. The message carries the job id
+    (the Privacy Shield copy keeps it as redacted_from), so an attempt that already
+    checkpointed it continues from the checkpoint instead of sending the message twice.
+    @returns (input state for stream_graph, whether the graph should run at all,
+              checkpointed output when the turn already finished before the crash)
+    """
+    snapshot = await graph_app.aget_state(config)
+    messages = snapshot.values.get("messages", []) if snapshot else []
+    if not any(m.id == job["id"] or m.additional_kwargs.get("redacted_from") == job["id"] for m in messages):
+        return state, True, None
+    if not snapshot.next:
+        # Completed turn (the crash hit after the graph ended): replay its answer, do not run it again
+        return None, False, snapshot.values if snapshot.values.get("response") is not None else None
+    # Paused before escalation: the turn is over, resuming here would bypass the approval
+    return None, "escalation" not in snapshot.next, None
+
+async def run_job(graph_app, job: dict, worker_id: str):
+    """
+    Executes one queued job ("chat" or "resume") and streams its events back through the queue.
+    """
+    thread_id = job["thread_id"]
+    payload = job["payload"]
+    config = {"configurable": {"thread_id": thread_id}}
+    trace = tracer.start_trace("chat", thread_id=thread_id, job_id=job["id"], kind=job["kind"], worker=worker_id, provider=payload.get("provider") or "")
+    config["callbacks"] = tracer.callbacks(trace)
+    publisher = EventPublisher(job["id"])
+    beat = asyncio.create_task(heartbeat(job["id"], worker_id, asyncio.current_task()))
+
+    state = None  # resume: continue the interrupted thread from its checkpoint
+    if job["kind"] == "chat":
+        state = {
+            "messages": [HumanMessage(content=payload["message"], id=job["id"])],
+            "all_responses": [],
+            "config_override": payload.get("config_override", {})
+        }
+
+    print(f"[WORKER] {worker_id} running {job['kind']} job {job['id']} (thread {thread_id}, attempt {job['attempts']})")
+    error, result = None, None
+    try:
+        run, finished = True, None
+        if job["attempts"] > 1:
+            if job["kind"] == "chat":
+                state, run, finished = await retry_state(graph_app, job, {"configurable": {"thread_id": thread_id}}, state)
+            await publisher.emit({"event": RESET_EVENT, "data": json.dumps({"attempt": job["attempts"], "resumed": state is None})})
+        await publisher.emit({"event": "status", "data": json.dumps({"node": "worker", "worker": worker_id, "job_id": job["id"], "trace_id": trace.trace_id if trace else None})})
+        if run:
+            async for sse in stream_graph(graph_app, state, config):
+                if sse["event"] == "final_response":
+                    result = json.loads(sse["data"])
+                await publisher.emit(sse)
+        elif finished is not None:
+            sse = final_response(finished)
+            result = json.loads(sse["data"])
+            await publisher.emit(sse)
+        await publisher.close()
+        await escalations.track(graph_app, {"configurable": {"thread_id": thread_id}})
+    except Exception as e:
+        print(f"[CRITICAL] Job {job['id']} failed: {e}")
+        error = str(e)
+        try:
+            await publisher.close()
+        except Exception:
+            pass
+    finally:
+        beat.cancel()
+        tracer.finish_trace(trace, Exception(error) if error else None)
+    await asyncio.to_thread(job_queue.finish, job["id"], error, result)
+
+async def worker_loop(concurrency: int = GRAPH_WORKER_CONCURRENCY, checkpoint_path: str = CHECKPOINT_DB_PATH):
+    """
+    One worker process: up to `concurrency` jobs in flight on a single event loop, sharing a
+    SQLite checkpointer so any worker can continue any thread (follow-ups, resumes).
+    """
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with AsyncSqliteSaver.from_conn_string(checkpoint_path) as saver:
+        graph_app = build_workflow(checkpointer=saver)
+        slots = asyncio.Semaphore(max(1, concurrency))
+        running = set()
+        poll = JOB_POLL_INTERVAL_MS / 1000
+        idle_sleep = poll
+        last_purge = 0.0
+        print(f"[WORKER] {worker_id} ready ({concurrency} slots)")
+
+        while not stop.is_set():
+            await slots.acquire()
+            job = await asyncio.to_thread(job_queue.claim, worker_id)
+            if job is None:
+                slots.release()
+                if time.monotonic() - last_purge > 60:
+                    last_purge = time.monotonic()
+                    await asyncio.to_thread(job_queue.purge, JOB_RETENTION_SECONDS)
+                # Back off while idle (up to 10x the poll interval), reset on the next job
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=idle_sleep)
+                except asyncio.TimeoutError:
+                    pass
+                idle_sleep = min(idle_sleep * 2, poll * 10)
+                continue
+            idle_sleep = poll
+            task = asyncio.create_task(run_job(graph_app, job, worker_id))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        # Drain: finish the jobs already claimed before exiting
+        if running:
+            print(f"[WORKER] {worker_id} draining {len(running)} jobs...")
+            await asyncio.gather(*running, return_exceptions=True)
+    print(f"[WORKER] {worker_id} stopped.")
+
+def _worker_main(concurrency: int):
+    asyncio.run(worker_loop(concurrency))
+
+def run_pool(processes: int, concurrency: int):
+    """
+    Supervises `processes` worker processes, restarting any that exit unexpectedly.
+    With fork, agents and RAG indexes are built once here and shared copy-on-write.
+    """
+    if processes <= 1:
+        init_agents()
+        _worker_main(concurrency)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    if ctx.get_start_method() == "fork":
+        init_agents()
+
+    stopping = False
+    workers = []
+
+    def spawn():
+        p = ctx.Process(target=_worker_main, args=(concurrency,), daemon=False)
+        p.start()
+        return p
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for p in workers:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    workers.extend(spawn() for _ in range(processes))
+    print(f"[WORKER] Started {processes} graph workers: {[p.pid for p in workers]}")
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        multiprocessing.connection.wait([p.sentinel for p in workers])
+        for i, p in enumerate(workers):
+            if p.is_alive():
+                continue
+            p.join()
+            if stopping:
+                workers[i] = None
+            else:
+                print(f"[RECOVER] Graph worker {p.pid} exited ({p.exitcode}); restarting.")
+                workers[i] = spawn()
+        workers[:] = [p for p in workers if p is not None]
+
+def main():
+    """
+    Graph worker pool for EXECUTION_MODE=queue, e.g.:
+        python graph_worker.py --processes 4 --concurrency 8
+    API front-ends (EXECUTION_MODE=queue) only enqueue and relay, so both sides scale
+    independently. The sqlite backend is host-local; spanning nodes needs a networked
+    JobQueue backend and checkpointer.
+    """
+    parser = argparse.ArgumentParser(description="Run graph-execution workers for the job queue.")
+    parser.add_argument("--processes", type=int, default=GRAPH_WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=GRAPH_WORKER_CONCURRENCY, help="Jobs in flight per process")
+    args = parser.parse_args()
+    run_pool(args.processes, args.concurrency)
+
+if __name__ == "__main__":
+    main()
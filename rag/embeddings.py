@@ -1,18 +1,126 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_core.embeddings import DeterministicFakeEmbedding
-from config import OPENAI_API_KEY
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from config import OPENAI_API_KEY, EMBEDDING_PROVIDER, EMBEDDING_DIM
+from functools import lru_cache
+from typing import Callable, List, Tuple
+import hashlib
+import math
 import os
+import re
+import numpy as np
 
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at", "for", "with", "by", "from",
+    "is", "are", "was", "were", "be", "been", "am", "do", "does", "did", "i", "me", "my", "we", "our",
+    "you", "your", "it", "its", "this", "that", "these", "those", "can", "could", "should", "would",
+    "will", "what", "how", "when", "where", "which", "who", "please", "there", "have", "has", "had"
+}
+
+class HashedNgramEmbedding(Embeddings):
+    """
+    Offline, CPU-only embedding model with real lexical/semantic locality.
+    Word unigrams, word bigrams and character n-grams (which tie together word variants
+    such as "reimburse"/"reimbursement") are hashed into a fixed number of signed
+    dimensions, weighted by sublinear term frequency and L2-normalized, so cosine
+    similarity (and FAISS L2 ranking) reflects shared vocabulary. Deterministic across
+    processes and fast for batched calls: per-word features are cached and each text is
+    a single numpy scatter-add.
+    """
+    def __init__(self, size: int = EMBEDDING_DIM, char_ngrams: Tuple[int, ...] = (3, 4), char_weight: float = 0.5, bigram_weight: float = 0.5):
+        self.size = size
+        self.char_ngrams = char_ngrams
+        self.char_weight = char_weight
+        self.bigram_weight = bigram_weight
+        self._word_features = lru_cache(maxsize=100_000)(self._compute_word_features)
+
+    def _hash(self, feature: str) -> Tuple[int, float]:
+        # blake2b instead of hash(): Python's str hash is salted per process
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        return digest % self.size, 1.0 if (digest >> 63) & 1 else -1.0
+
+    def _compute_word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        index, sign = self._hash(f"w:{word}")
+        indices, weights = [index], [sign]
+        padded = f"<{word}>"
+        grams = [padded[i:i + n] for n in self.char_ngrams for i in range(len(padded) - n + 1)]
+        for gram in grams:
+            index, sign = self._hash(f"c:{gram}")
+            indices.append(index)
+            weights.append(sign * self.char_weight / math.sqrt(len(grams)))
+        return np.asarray(indices, dtype=np.int64), np.asarray(weights, dtype=np.float32)
+
+    def _embed(self, text: str) -> np.ndarray:
+        words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS]
+        vector = np.zeros(self.size, dtype=np.float32)
+        if not words:
+            return vector
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            indices, weights = self._word_features(word)
+            np.add.at(vector, indices, weights * (1.0 + math.log(count)))
+        for first, second in zip(words, words[1:]):
+            index, sign = self._hash(f"b:{first} {second}")
+            vector[index] += sign * self.bigram_weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return np.vstack([self._embed(t) for t in texts]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+class ForkSafeEmbeddings(Embeddings):
+    """
+    Per-process wrapper for an HTTP-backed embeddings model: the client (and its connection
+    pool) is rebuilt on first use in each process, so workers forked after warm-up never
+    share sockets with the parent or with each other.
+    """
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._model = None
+        self._pid = None
+
+    @property
+    def model(self) -> Embeddings:
+        if self._pid != os.getpid():
+            self._model = self._factory()
+            self._pid = os.getpid()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.model.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.model.aembed_query(text)
+
+@lru_cache(maxsize=1)
 def get_embeddings():
     """
-    Returns the embeddings model. Uses OpenAI if key is present, 
-    otherwise falls back to a deterministic fake to allow the system to start.
+    Returns the shared embeddings model (created once per process) selected by EMBEDDING_PROVIDER:
+    "openai", "hashed" (offline n-gram model), "fake" (random vectors) or "auto"
+    (OpenAI if a key is present, otherwise the offline model so retrieval stays meaningful).
     """
-    if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here":
+    has_key = OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here"
+    if EMBEDDING_PROVIDER == "openai" or (EMBEDDING_PROVIDER == "auto" and has_key):
         try:
-            return OpenAIEmbeddings(api_key=OPENAI_API_KEY)
+            from langchain_openai import OpenAIEmbeddings
+            embeddings = ForkSafeEmbeddings(lambda: OpenAIEmbeddings(api_key=OPENAI_API_KEY))
+            embeddings.model  # Fail over here (not on first query) if the client cannot be built
+            return embeddings
         except Exception:
             pass
-            
-    # Fallback to local fake embeddings for zero-key startup stability
-    return DeterministicFakeEmbedding(size=1536)
+
+    if EMBEDDING_PROVIDER == "fake":
+        return DeterministicFakeEmbedding(size=1536)
+    # Local embeddings for zero-key startup (and offline benchmarks)
+    return HashedNgramEmbedding()
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from rag.vectorstore import batch_search, embed_queries
+from config import PREFETCH_TIMEOUT_SECONDS, PREFETCH_TTL_SECONDS, PREFETCH_MAX_PENDING
+
+class RetrievalPrefetcher:
+    """
+    Speculative cross-domain retrieval.
+    Embeds the redacted query once and searches every registered domain index in the
+    background while the Supervisor is still classifying. The chosen domain agent takes
+    its slice of the results; everything else is dropped and counted as wasted.
+    """
+    def __init__(self, max_workers: int = 4):
+        self.stores = {}
+        self._pending = OrderedDict()  # query -> (started_at, future)
+        self._lock = threading.Lock()
+        # Context-propagating pool so tracing spans attach to the prefetch node
+        self._pool = ContextThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-prefetch")
+        self.stats = {
+            "started": 0,
+            "hits": 0,
+            "misses": 0,
+            "wasted_prefetches": 0,  # Prefetches no agent consumed at all
+            "wasted_searches": 0     # Domain searches whose results were discarded
+        }
+
+    def register(self, store):
+        """
+        Adds a VectorStoreManager to the set of domains searched speculatively.
+        """
+        self.stores[store.domain] = store
+
+    def start(self, query: str):
+        """
+        Kicks off embedding + all-domain search for the query without blocking.
+        """
+        if not self.stores or not query:
+            return
+
+        with self._lock:
+            self._evict_expired()
+            if query in self._pending:
+                return
+            self._pending[query] = (time.monotonic(), self._pool.submit(self._retrieve, query))
+            self.stats["started"] += 1
+
+            while len(self._pending) > PREFETCH_MAX_PENDING:
+                _, (_, future) = self._pending.popitem(last=False)
+                self._discard(future)
+
+    def take(self, query: str, domain: str, with_vector: bool = False):
+        """
+        Returns the prefetched documents for one domain and drops the rest.
+        @param query - Query the domain agent is about to search for
+        @param domain - Domain of the calling agent
+        @param with_vector - Also return the query embedding computed by the prefetch
+        @returns Documents, or None if no usable (non-empty) prefetch exists (caller should search itself);
+                 (documents, vector) pairs with with_vector, both None on a miss
+        """
+        miss = (None, None) if with_vector else None
+        with self._lock:
+            entry = self._pending.pop(query, None)
+            if entry is None:
+                self.stats["misses"] += 1
+                return miss
+
+        # Wait outside the lock: other agents and start() must not block on this search
+        try:
+            vector, results = entry[1].result(timeout=PREFETCH_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"[RAG] Prefetch unavailable for {domain}: {e}")
+            with self._lock:
+                self.stats["misses"] += 1
+            return miss
+
+        with self._lock:
+            # No results for the domain is a miss too: the agent searches itself (e.g. with its own threshold)
+            if not results.get(domain):
+                self.stats["misses"] += 1
+                self.stats["wasted_prefetches"] += 1
+                self.stats["wasted_searches"] += len(results)
+                return miss
+            self.stats["hits"] += 1
+            self.stats["wasted_searches"] += len(results) - 1
+        print(f"[RAG] Prefetch hit for {domain}.")
+        return (results[domain], vector) if with_vector else results[domain]
+
+    def finish_turn(self, query: str):
+        """
+        Drops the turn's prefetch if no agent consumed it (greeting, escalation, planner
+        sub-tasks), so it is counted as wasted when the turn ends rather than on eviction.
+        """
+        with self._lock:
+            entry = self._pending.pop(query, None)
+            if entry is not None:
+                self._discard(entry[1])
+
+    def _retrieve(self, query: str):
+        stores = list(self.stores.values())
+        matrix = embed_queries(stores[0].embeddings, [query])
+        results = batch_search(stores, [query], matrix=matrix)
+        return matrix[0], {domain: per_query[0] for domain, per_query in results.items()}
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        while self._pending:
+            query, (started_at, future) = next(iter(self._pending.items()))
+            if now - started_at < PREFETCH_TTL_SECONDS:
+                break
+            del self._pending[query]
+            self._discard(future)
+
+    def _discard(self, future):
+        # Callers hold self._lock
+        future.cancel()
+        self.stats["wasted_prefetches"] += 1
+        self.stats["wasted_searches"] += len(self.stores)
+
+# Shared instance: domain agents register their stores at graph construction time
+prefetcher = RetrievalPrefetcher()
@@ -0,0 +1,245 @@
+import math
+import threading
+from typing import Dict, Iterable, List, Optional
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from rag.embeddings import get_embeddings
+from tracing import tracer
+from config import UNIFIED_IVF_THRESHOLD, UNIFIED_IVF_NPROBE
+
+class UnifiedVectorIndex:
+    """
+    One FAISS index holding the chunks of every domain, tagged with domain/source metadata.
+    - Chunks get stable int64 ids; per-domain id sets turn into an IDSelector, so a search
+      can be limited to one domain, a set of domains, or run over all of them in one call.
+    - Starts as an exact flat index and rebalances into IVF once it holds
+      UNIFIED_IVF_THRESHOLD vectors (and again when it grows or shrinks 4x), retraining
+      the coarse quantizer on the current vectors.
+    - Uses the shared embedding model, so every domain is embedded once, by one model.
+    """
+    def __init__(self, embeddings=None, ivf_threshold: int = UNIFIED_IVF_THRESHOLD, nprobe: int = UNIFIED_IVF_NPROBE):
+        self._embeddings = embeddings
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self.index = None
+        self.dimension = None
+        self.chunks: Dict[int, Document] = {}
+        self.domain_ids: Dict[str, np.ndarray] = {}
+        self._next_id = 0
+        self.trained_size = 0  # Size the current IVF layout was trained for (0 = flat)
+        self.stats = {"rebalances": 0, "searches": 0}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    # --- Writes ---
+
+    def add_documents(self, domain: str, docs: List[Document]) -> List[int]:
+        """
+        Embeds and adds chunks for a domain.
+        @returns Chunk ids assigned to the documents
+        """
+        if not docs:
+            return []
+        with tracer.span("embedding", queries=len(docs), purpose="unified_index"):
+            vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+        with self._lock:
+            return self._add_vectors(domain, docs, vectors)
+
+    def replace_domain(self, domain: str, docs: List[Document]) -> List[int]:
+        """
+        Swaps all chunks of a domain (re-indexing). Embedding happens before the swap,
+        so searches see either the old or the new chunks, never an empty domain.
+        """
+        vectors = None
+        if docs:
+            with tracer.span("embedding", queries=len(docs), purpose="unified_index"):
+                vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+        with self._lock:
+            self._remove_domain_locked(domain, rebalance=False)
+            return self._add_vectors(domain, docs, vectors) if docs else []
+
+    def remove_domain(self, domain: str) -> int:
+        with self._lock:
+            return self._remove_domain_locked(domain)
+
+    def _add_vectors(self, domain: str, docs: List[Document], vectors: np.ndarray) -> List[int]:
+        if self.index is None:
+            self.dimension = vectors.shape[1]
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        ids = np.arange(self._next_id, self._next_id + len(docs), dtype=np.int64)
+        self._next_id += len(docs)
+        self.index.add_with_ids(vectors, ids)
+        for chunk_id, doc in zip(ids.tolist(), docs):
+            self.chunks[chunk_id] = Document(id=str(chunk_id), page_content=doc.page_content, metadata={**doc.metadata, "domain": domain, "chunk_id": chunk_id})
+        self.domain_ids[domain] = np.concatenate([self.domain_ids.get(domain, np.empty(0, dtype=np.int64)), ids])
+        self._maybe_rebalance()
+        return ids.tolist()
+
+    def _remove_domain_locked(self, domain: str, rebalance: bool = True) -> int:
+        ids = self.domain_ids.pop(domain, None)
+        if ids is None or len(ids) == 0 or self.index is None:
+            return 0
+        # IDSelectorArray: the only selector IVF's hashtable direct map can remove with
+        removed = self.index.remove_ids(faiss.IDSelectorArray(ids))
+        for chunk_id in ids.tolist():
+            self.chunks.pop(chunk_id, None)
+        if rebalance:
+            self._maybe_rebalance()
+        return removed
+
+    # --- Rebalancing ---
+
+    def _maybe_rebalance(self):
+        n = self.ntotal
+        if self.trained_size == 0:
+            needed = n >= self.ivf_threshold
+        else:
+            needed = n >= self.trained_size * 4 or n < self.trained_size / 4
+        if needed:
+            self.rebalance()
+
+    def rebalance(self):
+        """
+        Rebuilds the index for its current size: exact flat below the IVF threshold,
+        otherwise IVF with nlist ~ 4*sqrt(n), trained on a sample of the stored vectors.
+        """
+        with self._lock:
+            n = self.ntotal
+            if n == 0:
+                return
+            all_ids = np.concatenate(list(self.domain_ids.values())) if self.domain_ids else np.empty(0, dtype=np.int64)
+            with tracer.span("unified_index.rebalance", vectors=n):
+                if n < self.ivf_threshold:
+                    new_index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+                    trained_size = 0
+                else:
+                    nlist = max(16, int(4 * math.sqrt(n)))
+                    sample_ids = np.random.default_rng(0).choice(all_ids, size=min(n, nlist * 64), replace=False)
+                    new_index = faiss.IndexIVFFlat(faiss.IndexFlatL2(self.dimension), self.dimension, nlist)
+                    new_index.train(self.index.reconstruct_batch(sample_ids))
+                    # Hashtable direct map keeps reconstruct() and remove_ids() working with sparse ids
+                    new_index.set_direct_map_type(faiss.DirectMap.Hashtable)
+                    trained_size = n
+                for start in range(0, len(all_ids), 10000):
+                    batch = all_ids[start:start + 10000]
+                    new_index.add_with_ids(self.index.reconstruct_batch(batch), batch)
+            self.index = new_index
+            self.trained_size = trained_size
+            self.stats["rebalances"] += 1
+            print(f"[RAG] Unified index rebalanced: {n} vectors, {'IVF nlist=' + str(new_index.nlist) if trained_size else 'flat'}.")
+
+    # --- Reads ---
+
+    def _search_params(self, domains: Optional[Iterable[str]]):
+        selector = None
+        if domains is not None:
+            wanted = set(domains)
+            if wanted != set(self.domain_ids):
+                ids = [self.domain_ids[d] for d in wanted if d in self.domain_ids]
+                if not ids:
+                    return None, False
+                selector = faiss.IDSelectorBatch(np.concatenate(ids))
+        if self.trained_size:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe), True
+        return (faiss.SearchParameters(sel=selector) if selector is not None else None), True
+
+    def _search(self, matrix: np.ndarray, k: int, domains: Optional[Iterable[str]]) -> List[List[tuple]]:
+        # One FAISS search; per query row, (distance, chunk) pairs nearest first
+        with self._lock:
+            if self.index is None or self.ntotal == 0 or len(matrix) == 0:
+                return [[] for _ in range(len(matrix))]
+            params, has_candidates = self._search_params(domains)
+            if not has_candidates:
+                return [[] for _ in range(len(matrix))]
+            self.stats["searches"] += 1
+            with tracer.span("faiss.search", domain=",".join(sorted(domains)) if domains is not None else "*", queries=len(matrix), k=k):
+                distances, ids = self.index.search(np.asarray(matrix, dtype=np.float32), min(k, self.ntotal), params=params)
+            return [
+                [(d, self.chunks[i]) for d, i in zip(row_d, row_i) if i != -1 and i in self.chunks]
+                for row_d, row_i in zip(distances, ids)
+            ]
+
+    def search_matrix(self, matrix: np.ndarray, k: int = 5, domains: Optional[Iterable[str]] = None, score_threshold: Optional[float] = None) -> List[List[Document]]:
+        """
+        One FAISS search for all query rows, restricted to `domains` (None = all domains).
+        @param matrix - Query embeddings, one row per query
+        @param k - Results per query (across the selected domains)
+        @param domains - Domain names to search
+        @param score_threshold - Max L2 distance to keep; None keeps top K
+        @returns One document list per query row, nearest first
+        """
+        return [
+            [doc for d, doc in row if score_threshold is None or d <= score_threshold]
+            for row in self._search(matrix, k, domains)
+        ]
+
+    def search_domains(self, matrix: np.ndarray, k: Dict[str, int], score_threshold: Optional[Dict[str, float]] = None) -> Dict[str, List[List[Document]]]:
+        """
+        Multi-domain lookup: one FAISS search over every requested domain (one IDSelector),
+        split back per domain, then a domain-only search for the query rows where a domain
+        came up short because nearer chunks of other domains filled the shared top sum(k).
+        Every domain gets its own k results (fewer only when its chunks run out or its threshold cuts them).
+        @param k - Results per query, keyed by domain (the domains to search)
+        @param score_threshold - Max L2 distance per domain (missing = no threshold)
+        @returns {domain: [docs for query 0, docs for query 1, ...]}
+        """
+        thresholds = score_threshold or {}
+        total = sum(k.values())
+        results = {domain: [[] for _ in range(len(matrix))] for domain in k}
+        rows = self._search(matrix, total, set(k))
+        for i, row in enumerate(rows):
+            for distance, doc in row:
+                domain = doc.metadata["domain"]
+                limit = thresholds.get(domain)
+                if len(results[domain][i]) < k[domain] and (limit is None or distance <= limit):
+                    results[domain][i].append(doc)
+
+        for domain, wanted in k.items():
+            wanted = min(wanted, len(self.domain_ids.get(domain, ())))
+            limit = thresholds.get(domain)
+            # Unseen chunks lie beyond the row's last distance: only full rows still under the threshold can hide more
+            short = [i for i, row in enumerate(rows)
+                     if len(results[domain][i]) < wanted and len(row) >= total and (limit is None or row[-1][0] <= limit)]
+            if not short:
+                continue
+            for i, row in zip(short, self._search(matrix[short], k[domain], [domain])):
+                results[domain][i] = [doc for d, doc in row if limit is None or d <= limit]
+        return results
+
+    def search(self, query: str, k: int = 5, domains: Optional[Iterable[str]] = None, score_threshold: Optional[float] = None) -> List[Document]:
+        """
+        Embeds a query and searches the selected domains in a single call,
+        e.g. search(q, domains={"IT", "Finance"}) for a multi-intent question.
+        """
+        with tracer.span("embedding", queries=1):
+            vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        return self.search_matrix(vector, k, domains, score_threshold)[0]
+
+    def reconstruct(self, chunk_ids: List[int]) -> np.ndarray:
+        """
+        Stored vectors for chunk ids (rows in the same order).
+        """
+        with self._lock:
+            return self.index.reconstruct_batch(np.asarray(chunk_ids, dtype=np.int64))
+
+    def describe(self) -> dict:
+        with self._lock:
+            return {
+                "vectors": self.ntotal,
+                "layout": f"ivf(nlist={self.index.nlist})" if self.trained_size else "flat",
+                "domains": {d: len(ids) for d, ids in self.domain_ids.items()},
+                "stats": dict(self.stats)
+            }
+
+# Shared index used by VectorStoreManager when UNIFIED_INDEX_ENABLED is set
+unified_index = UnifiedVectorIndex()
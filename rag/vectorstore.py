@@ -1,16 +1,21 @@
 import os
 import json
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import numpy as np
+from typing import Dict, List, Optional, Union
 from langchain_core.documents import Document
 from rag.embeddings import get_embeddings
+from tracing import tracer
+from config import UNIFIED_INDEX_ENABLED
 
-# Conditional imports for advanced file types
-try:
-    from langchain_community.document_loaders import PyPDFLoader
-    HAS_PDF = True
-except ImportError:
-    HAS_PDF = False
+def _pdf_loader():
+    """
+    PDF support is optional; the loader (and its dependencies) are only imported when a PDF is indexed.
+    """
+    try:
+        from langchain_community.document_loaders import PyPDFLoader
+        return PyPDFLoader
+    except ImportError:
+        return None
 
 class VectorStoreManager:
     """
@@ -22,13 +27,38 @@ class VectorStoreManager:
         self.data_path = data_path
         self.embeddings = get_embeddings()
         self.vector_store = None
+        self.unified = None
+        if UNIFIED_INDEX_ENABLED:
+            # faiss is only imported on the unified path (the per-domain path gets it via langchain)
+            from rag.unified import unified_index
+            self.unified = unified_index
+        self._positions = None  # docstore id -> FAISS row, built on first chunk_vectors()
         self.initialize_store()
 
     def initialize_store(self):
         """
         Processes domain documents and initializes the vector index.
         Supports persistence of the index itself to speed up subsequent loads.
+        With UNIFIED_INDEX_ENABLED the chunks go into the shared cross-domain index instead.
         """
+        chunks = self._load_chunks()
+        self._positions = None
+        if self.unified is not None:
+            self.unified.replace_domain(self.domain, chunks)
+            return
+
+        # Heavy imports are deferred to the first index build to keep process startup fast
+        from langchain_community.vectorstores import FAISS
+
+        # 3. Vectorization
+        self.vector_store = FAISS.from_documents(chunks, self.embeddings)
+
+    def _load_chunks(self) -> List[Document]:
+        """
+        Loads and splits the domain documents (a placeholder chunk when there are none).
+        """
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         os.makedirs(self.data_path, exist_ok=True)
         index_cache = os.path.join(self.data_path, "faiss_index")
         
@@ -39,8 +69,7 @@ class VectorStoreManager:
         
         if not files:
             print(f"[RAG] No files found for {self.domain}. Initializing empty store.")
-            self.vector_store = FAISS.from_texts([f"This is a placeholder for {self.domain}."], self.embeddings)
-            return
+            return [Document(page_content=f"This is a placeholder for {self.domain}.")]
 
         print(f"[RAG] 📦 Indexing {self.domain} Knowledge Base ({len(files)} items)...")
         all_docs = []
@@ -53,16 +82,15 @@ class VectorStoreManager:
                         content = file.read()
                         all_docs.append(Document(page_content=content, metadata={"source": f, "type": "text"}))
                 
-                elif f.endswith('.pdf') and HAS_PDF:
-                    loader = PyPDFLoader(file_path)
+                elif f.endswith('.pdf') and _pdf_loader():
+                    loader = _pdf_loader()(file_path)
                     all_docs.extend(loader.load())
                     
             except Exception as e:
                 print(f"[RAG] ⚠️ Error loading {f}: {e}")
 
         if not all_docs:
-            self.vector_store = FAISS.from_texts([f"Empty {self.domain} store."], self.embeddings)
-            return
+            return [Document(page_content=f"Empty {self.domain} store.")]
             
         # 2. Optimized Splitting (Quality Gap)
         text_splitter = RecursiveCharacterTextSplitter(
@@ -71,25 +99,139 @@ class VectorStoreManager:
             separators=["\n\n", "\n", ".", " ", ""]
         )
         split_docs = text_splitter.split_documents(all_docs)
-        
-        # 3. Vectorization
-        self.vector_store = FAISS.from_documents(split_docs, self.embeddings)
         print(f"[RAG] ✅ {self.domain} ready. {len(split_docs)} semantic chunks indexed.")
+        return split_docs
 
-    def search(self, query: str, k: int = 5):
+    def embed_query(self, query: str) -> np.ndarray:
+        with tracer.span("embedding", queries=1):
+            return np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+
+    def chunk_vectors(self, chunk_ids: List[str]):
         """
-        Returns relevant context with source metadata.
+        Looks up chunks and their stored embeddings by id (no re-embedding).
+        Ids that no longer exist (e.g. after a re-index) are skipped.
+        @returns (ids found, documents, (n x dim) vector matrix)
         """
+        if self.unified is not None:
+            found = [c for c in chunk_ids if str(c).isdigit() and int(c) in self.unified.chunks]
+            if not found:
+                return [], [], np.empty((0, 0), dtype=np.float32)
+            return found, [self.unified.chunks[int(c)] for c in found], self.unified.reconstruct([int(c) for c in found])
+
         if not self.vector_store:
+            return [], [], np.empty((0, 0), dtype=np.float32)
+        if self._positions is None:
+            self._positions = {doc_id: pos for pos, doc_id in self.vector_store.index_to_docstore_id.items()}
+        found = [c for c in chunk_ids if c in self._positions]
+        if not found:
+            return [], [], np.empty((0, 0), dtype=np.float32)
+        vectors = self.vector_store.index.reconstruct_batch(np.asarray([self._positions[c] for c in found], dtype=np.int64))
+        return found, [self.vector_store.docstore.search(c) for c in found], vectors
+
+    def search_by_vector(self, embedding: list, k: int = 5, score_threshold: Optional[float] = None):
+        """
+        Same as search, but for a query that has already been embedded.
+        Lets callers embed once and search several domain indexes.
+        """
+        return self.search_matrix(np.asarray([embedding], dtype=np.float32), k, score_threshold)[0]
+
+    def search_matrix(self, matrix: np.ndarray, k: int = 5, score_threshold: Optional[float] = None) -> List[List[Document]]:
+        """
+        Runs one FAISS search for a whole (n_queries x dim) matrix of query embeddings.
+        @param matrix - Query embeddings, one row per query
+        @param k - Results per query
+        @param score_threshold - Max L2 distance to keep (lower = more similar); None keeps top K
+        @returns One document list per query row
+        """
+        if self.unified is not None:
+            return self.unified.search_matrix(matrix, k, domains=[self.domain], score_threshold=score_threshold)
+        if not self.vector_store or len(matrix) == 0:
+            return [[] for _ in range(len(matrix))]
+        
+        try:
+            index = self.vector_store.index
+            with tracer.span("faiss.search", domain=self.domain, queries=len(matrix), k=k):
+                distances, positions = index.search(matrix, min(k, index.ntotal))
+            results = []
+            for row_distances, row_positions in zip(distances, positions):
+                docs = []
+                for distance, position in zip(row_distances, row_positions):
+                    if position == -1:
+                        continue
+                    if score_threshold is not None and distance > score_threshold:
+                        continue
+                    doc_id = self.vector_store.index_to_docstore_id[position]
+                    docs.append(self.vector_store.docstore.search(doc_id))
+                results.append(docs)
+            return results
+        except Exception as e:
+            print(f"[RAG] Vector search error for {self.domain}: {e}")
+            return [[] for _ in range(len(matrix))]
+
+    def search_batch(self, queries: List[str], k: int = 5, score_threshold: Optional[float] = None) -> List[List[Document]]:
+        """
+        Embeds all queries in one call and searches them with a single matrix search.
+        """
+        if not queries:
+            return []
+        return self.search_matrix(embed_queries(self.embeddings, queries), k, score_threshold)
+
+    def search(self, query: str, k: int = 5, score_threshold: Optional[float] = None):
+        """
+        Returns relevant context with source metadata.
+        """
+        if not self.vector_store and self.unified is None:
             return []
         
         try:
-            # Similarity search with score to allow filtering out low-quality matches
-            docs_and_scores = self.vector_store.similarity_search_with_score(query, k=k)
-            
-            # Filter matches that are too generic (higher score in FAISS L2 = lower similarity)
-            # Threshold varies by embedding model, but we'll return top K for now
-            return [doc for doc, score in docs_and_scores]
+            # Embed once, then reuse the matrix search path.
+            # score_threshold filters generic matches (higher L2 = lower similarity); it varies by model, so it is opt-in
+            return self.search_by_vector(self.embed_query(query), k=k, score_threshold=score_threshold)
         except Exception as e:
             print(f"[RAG] Search error for {self.domain}: {e}")
             return []
+
+def embed_queries(embeddings, queries: List[str]) -> np.ndarray:
+    """
+    Embeds a list of queries with a single model call.
+    """
+    with tracer.span("embedding", queries=len(queries)):
+        return np.asarray(embeddings.embed_documents(list(queries)), dtype=np.float32)
+
+def batch_search(
+    stores: List[VectorStoreManager],
+    queries: List[str],
+    k: Union[int, Dict[str, int]] = 5,
+    score_threshold: Union[None, float, Dict[str, float]] = None,
+    matrix: Optional[np.ndarray] = None
+) -> Dict[str, List[List[Document]]]:
+    """
+    Multi-query, multi-domain search: one embedding call for all N queries, then one
+    matrix search per domain index (a single search for all domains in the unified index,
+    topped up per domain so each still gets its own k).
+    @param stores - Domain stores to search (must share an embedding model)
+    @param queries - Queries to run against every domain
+    @param k - Results per query, either global or keyed by domain
+    @param score_threshold - Max L2 distance, either global or keyed by domain
+    @param matrix - Precomputed query embeddings (skips the embedding call)
+    @returns {domain: [docs for query 0, docs for query 1, ...]}
+    """
+    if not stores or not queries:
+        return {store.domain: [[] for _ in queries] for store in stores}
+
+    if matrix is None:
+        matrix = embed_queries(stores[0].embeddings, queries)
+    ks = {store.domain: k.get(store.domain, 5) if isinstance(k, dict) else k for store in stores}
+    thresholds = {store.domain: score_threshold.get(store.domain) if isinstance(score_threshold, dict) else score_threshold for store in stores}
+    unified = [store for store in stores if store.unified is not None]
+    unified_results = {}
+    if unified:
+        unified_results = unified[0].unified.search_domains(
+            matrix,
+            {store.domain: ks[store.domain] for store in unified},
+            {store.domain: thresholds[store.domain] for store in unified if thresholds[store.domain] is not None}
+        )
+    return {
+        store.domain: unified_results[store.domain] if store.unified is not None else store.search_matrix(matrix, ks[store.domain], thresholds[store.domain])
+        for store in stores
+    }
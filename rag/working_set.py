@@ -0,0 +1,114 @@
+import re
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from rag.prefetch import prefetcher
+from rag.embeddings import STOPWORDS
+from tracing import tracer
+from config import WORKING_SET_SIZE, WORKING_SET_FRESH_K, WORKING_SET_REUSE_OVERLAP, WORKING_SET_COVERAGE
+
+def query_overlap(a: str, b: str) -> float:
+    """
+    Jaccard overlap of the content words of two queries (1.0 = same terms).
+    """
+    terms_a = {w for w in re.findall(r"[a-z0-9]+", a.lower()) if w not in STOPWORDS}
+    terms_b = {w for w in re.findall(r"[a-z0-9]+", b.lower()) if w not in STOPWORDS}
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+def covers(previous: Optional[dict], query: str) -> bool:
+    """
+    True when a domain's working set will be reused as-is for the query (no search at all).
+    """
+    return bool(previous and previous.get("chunks")) and query_overlap(query, previous.get("query", "")) >= WORKING_SET_REUSE_OVERLAP
+
+def _cosine(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+    return (vectors @ query) / np.where(norms > 0, norms, 1.0)
+
+class RetrievalWorkingSet:
+    """
+    Per-thread retrieval reuse for domain agents.
+    The graph state keeps, per domain, the last query and a small working set of
+    (chunk id, similarity) pairs. On the next turn:
+    1. A follow-up with (almost) the same terms reuses the working set as-is: no embedding, no search.
+    2. Otherwise the query is embedded once and the working set is re-ranked against it using
+       the vectors stored in the index. If the working set still scores as well as it did for
+       the previous query, no search runs; else a smaller fresh search (WORKING_SET_FRESH_K)
+       adds new candidates before re-ranking.
+    3. Threads without a working set (or whose chunks disappeared in a re-index) do a full search.
+    """
+    def __init__(self, size: int = WORKING_SET_SIZE, fresh_k: int = WORKING_SET_FRESH_K):
+        self.size = size
+        self.fresh_k = fresh_k
+        self.stats = {"reused": 0, "reranked": 0, "reranked_with_search": 0, "full_searches": 0}
+
+    def retrieve(self, store, query: str, previous: Optional[dict], k: int = 5) -> Tuple[List[Document], dict]:
+        """
+        @param store - The agent's VectorStoreManager
+        @param query - Current (sub)task query
+        @param previous - This domain's working set from state["retrieval"], if any
+        @param k - Documents to return
+        @returns (documents for the prompt, new working-set entry for state["retrieval"][domain])
+        """
+        if previous and previous.get("chunks"):
+            if covers(previous, query):
+                ids = [chunk_id for chunk_id, _ in previous["chunks"][:k]]
+                kept, docs, _ = store.chunk_vectors(ids)
+                if docs:
+                    self.stats["reused"] += 1
+                    print(f"[RAG] {store.domain} follow-up reused {len(docs)} working-set chunks.")
+                    return docs, {**previous, "query": query}
+            with tracer.span("working_set.rerank", domain=store.domain):
+                result = self._rerank(store, query, previous, k)
+            if result is not None:
+                return result
+
+        self.stats["full_searches"] += 1
+        docs, vector = prefetcher.take(query, store.domain, with_vector=True)
+        if docs is None:
+            vector = store.embed_query(query)
+            docs = store.search_by_vector(vector, k=k)
+        return docs, self._entry(store, query, vector, docs)
+
+    def _rerank(self, store, query: str, previous: dict, k: int) -> Optional[Tuple[List[Document], dict]]:
+        ids, docs, vectors = store.chunk_vectors([chunk_id for chunk_id, _ in previous["chunks"]])
+        if not docs:
+            return None
+
+        prefetched, vector = prefetcher.take(query, store.domain, with_vector=True)
+        if vector is None:
+            vector = store.embed_query(query)
+        scores = _cosine(vectors, vector)
+
+        if scores.max() < previous.get("top_score", 0.0) * WORKING_SET_COVERAGE:
+            # The working set no longer covers the question well: add a few fresh candidates
+            fresh = prefetched if prefetched is not None else store.search_by_vector(vector, k=self.fresh_k)
+            new = [d for d in fresh[:max(self.fresh_k, k)] if d.id and d.id not in ids]
+            if new:
+                new_ids, new_docs, new_vectors = store.chunk_vectors([d.id for d in new])
+                ids, docs = ids + new_ids, docs + new_docs
+                scores = np.concatenate([scores, _cosine(new_vectors, vector)]) if len(new_vectors) else scores
+            self.stats["reranked_with_search"] += 1
+        else:
+            self.stats["reranked"] += 1
+
+        order = np.argsort(-scores)
+        ranked = [(ids[i], docs[i], float(scores[i])) for i in order]
+        print(f"[RAG] {store.domain} follow-up re-ranked {len(ranked)} candidates from the working set.")
+        return [doc for _, doc, _ in ranked[:k]], self._pack(query, [(i, s) for i, _, s in ranked])
+
+    def _entry(self, store, query: str, vector, docs: List[Document]) -> dict:
+        ids, _, vectors = store.chunk_vectors([d.id for d in docs if d.id])
+        if not ids:
+            return {"query": query, "chunks": [], "top_score": 0.0}
+        scores = _cosine(vectors, np.asarray(vector, dtype=np.float32))
+        return self._pack(query, sorted(zip(ids, scores.tolist()), key=lambda c: c[1], reverse=True))
+
+    def _pack(self, query: str, scored: List[tuple]) -> dict:
+        chunks = [[chunk_id, round(score, 4)] for chunk_id, score in scored[:self.size]]
+        return {"query": query, "chunks": chunks, "top_score": chunks[0][1] if chunks else 0.0}
+
+# Shared instance used by the domain agents
+working_set = RetrievalWorkingSet()
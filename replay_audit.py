@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+def load_traffic(store, sample: int, seed: int, since: str = None) -> list:
+    """
+    Reads recorded requests from the audit store, oldest first.
+    A seeded reservoir sample keeps runs comparable against the same baseline
+    without holding the whole log in memory.
+    """
+    rng = random.Random(seed)
+    records, seen = [], 0
+    for row in store.search(since=since, limit=None, order="asc"):
+        if not row["message"]:
+            continue
+        record = {"key": row["id"], "time": row["time"], "ts": row["ts"], "thread_id": row["thread_id"], "message": row["message"], "provider": row["provider"]}
+        seen += 1
+        if not sample or len(records) < sample:
+            records.append(record)
+        else:
+            slot = rng.randrange(seen)
+            if slot < sample:
+                records[slot] = record
+    records.sort(key=lambda r: (r["ts"], r["key"]))
+    return records
+
+def arrival_offsets(records: list, speedup: float) -> list:
+    """
+    Seconds after replay start at which each record is sent.
+    speedup=1 preserves recorded gaps, 10 compresses them 10x, 0 sends everything at once.
+    """
+    if speedup <= 0 or not records:
+        return [0.0] * len(records)
+    stamps = [r["ts"] for r in records]
+    return [(t - stamps[0]) / speedup for t in stamps]
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def replay(graph, records: list, speedup: float, concurrency: int, run_id: str) -> dict:
+    """
+    Pushes records through the graph on their (scaled) arrival schedule.
+    Turns of the same recorded conversation are replayed in order on one replay thread.
+    """
+    from langchain_core.messages import HumanMessage
+
+    semaphore = asyncio.Semaphore(concurrency)
+    thread_locks = {}
+    offsets = arrival_offsets(records, speedup)
+    started = time.perf_counter()
+    results = {}
+
+    async def run_one(record: dict, offset: float):
+        await asyncio.sleep(max(0.0, offset - (time.perf_counter() - started)))
+        thread_id = f"replay-{run_id}-{record['thread_id']}"
+        lock = thread_locks.setdefault(thread_id, asyncio.Lock())
+        async with lock, semaphore:
+            config = {"configurable": {"thread_id": thread_id}}
+            state = {"messages": [HumanMessage(content=record["message"])], "all_responses": []}
+            path = []
+            t0 = time.perf_counter()
+            try:
+                async for update in graph.astream(state, config, stream_mode="updates"):
+                    # The speculative prefetch branch is not a routing decision and races the supervisor
+                    path.extend(node for node in update if not node.startswith("__") and node != "prefetch")
+                snapshot = await graph.aget_state(config)
+                values = snapshot.values
+                if "escalation" in (snapshot.next or ()):
+                    path.append("escalation(pending)")
+                results[record["key"]] = {
+                    "path": path,
+                    "intent": values.get("intent"),
+                    "escalated": bool(path) and path[-1].startswith("escalation"),
+                    "latency_ms": round((time.perf_counter() - t0) * 1000, 1)
+                }
+            except Exception as e:
+                results[record["key"]] = {"path": path, "error": str(e), "latency_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    await asyncio.gather(*[run_one(r, o) for r, o in zip(records, offsets)])
+    wall = time.perf_counter() - started
+    latencies = [r["latency_ms"] for r in results.values() if "error" not in r]
+    return {
+        "run_id": run_id,
+        "requests": len(records),
+        "errors": sum("error" in r for r in results.values()),
+        "wall_seconds": round(wall, 2),
+        "throughput_per_sec": round(len(records) / wall, 2) if wall else 0.0,
+        "latency": {
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0
+        },
+        "results": results
+    }
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Lists regressions against a stored baseline: routing changes and latency growth
+    beyond `tolerance` (0.2 = 20%) at p50/p95.
+    """
+    problems = []
+    for key, base in baseline["results"].items():
+        current = report["results"].get(key)
+        if current is None:
+            continue
+        if current.get("path") != base.get("path"):
+            problems.append(f"routing changed for audit row {key}: {base.get('path')} -> {current.get('path')}")
+    for stat in ["p50_ms", "p95_ms"]:
+        before, after = baseline["latency"][stat], report["latency"][stat]
+        if before > 0 and after > before * (1 + tolerance):
+            problems.append(f"latency {stat} regressed: {before:.1f} -> {after:.1f} ms (+{(after / before - 1):.0%})")
+    if report["errors"] > baseline.get("errors", 0):
+        problems.append(f"errors increased: {baseline.get('errors', 0)} -> {report['errors']}")
+    return problems
+
+def main():
+    """
+    Replays recorded audit_log traffic for routing and latency regression testing, e.g.:
+        python replay_audit.py --sample 200 --speedup 20 --record-baseline
+        python replay_audit.py --sample 200 --speedup 20 --baseline replay_baseline.json
+    """
+    parser = argparse.ArgumentParser(description="Replay audit_log traffic through the graph.")
+    parser.add_argument("--audit-dir", default=None, help="Audit partition directory (default: AUDIT_DIR)")
+    parser.add_argument("--sample", type=int, default=100, help="Number of recorded messages (0 = all)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--since", help="Only replay rows recorded at or after this time (YYYY-MM-DD)")
+    parser.add_argument("--speedup", type=float, default=0, help="1 = original arrival timing, N = N times faster, 0 = no delays")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm", choices=["mock", "local", "configured"], default="mock", help="LLM used for the replay")
+    parser.add_argument("--local-url", help="OpenAI-compatible base URL for --llm local")
+    parser.add_argument("--baseline", default="replay_baseline.json")
+    parser.add_argument("--record-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed latency growth before failing")
+    parser.add_argument("--report", help="Write the full JSON report here")
+    args = parser.parse_args()
+
+    # Provider selection must happen before config/ai_service are imported
+    if args.llm != "configured":
+        os.environ["ACTIVE_PROVIDER"] = args.llm
+    if args.local_url:
+        os.environ["LOCAL_LLM_URL"] = args.local_url
+
+    from audit.store import AuditStore, audit_store
+    from graph.workflow import app as graph_app
+
+    store = AuditStore(directory=args.audit_dir) if args.audit_dir else audit_store
+    records = load_traffic(store, args.sample, args.seed, args.since)
+    if not records:
+        print("No recorded traffic to replay.")
+        return
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    print(f"[REPLAY] {len(records)} messages, speedup={args.speedup}, llm={args.llm}")
+    report = asyncio.run(replay(graph_app, records, args.speedup, args.concurrency, run_id))
+    report["llm"] = args.llm
+
+    print(f"\nREPLAY SUMMARY: {report['requests']} requests, {report['errors']} errors, "
+          f"{report['throughput_per_sec']} req/s, latency {report['latency']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.record_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline stored in {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --record-baseline first.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("llm") != args.llm:
+        print(f"Warning: baseline was recorded with llm={baseline.get('llm')}")
+
+    problems = compare(report, baseline, args.tolerance)
+    for problem in problems:
+        print(f"[REGRESSION] {problem}")
+    if problems:
+        sys.exit(1)
+    print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
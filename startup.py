@@ -0,0 +1,119 @@
+import os
+import socket
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+class StartupTimer:
+    """
+    Measures process startup by phase (imports, agent/RAG construction, graph compile).
+    - mark() records the time since the previous mark (sequential phases such as imports).
+    - phase() times a block (construction steps, possibly from the warm-up thread).
+    The report is served at /ready and printed once the service is warm.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self._lock = threading.Lock()
+        self.phases: List[dict] = []
+        self.ready_seconds: Optional[float] = None
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        with self._lock:
+            self.phases.append({"phase": name, "ms": round((now - self._last_mark) * 1000, 1)})
+            self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append({"phase": name, "ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_seconds is not None
+
+    def set_ready(self):
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self.started
+            self.print_report()
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "seconds_to_ready": round(self.ready_seconds, 3) if self.ready else None,
+            "uptime_seconds": round(time.perf_counter() - self.started, 3),
+            "phases": list(self.phases)
+        }
+
+    def print_report(self):
+        print(f"[STARTUP] Ready in {self.ready_seconds * 1000:.0f} ms (pid {os.getpid()})")
+        for p in self.phases:
+            print(f"[STARTUP]   {p['phase']:<28} {p['ms']:>9.1f} ms")
+
+# Process-wide startup timer (module import time is the reference point)
+startup_timer = StartupTimer()
+
+def _reset_http_clients():
+    """
+    Runs in every forked child: drops HTTP clients cached by the parent (LLM clients keep
+    pooled connections that must not be shared across processes).
+    Embeddings clients are per-process already (rag.embeddings.ForkSafeEmbeddings).
+    """
+    try:
+        from langchain_openai.chat_models import _client_utils
+        _client_utils._cached_sync_httpx_client.cache_clear()
+        _client_utils._cached_async_httpx_client.cache_clear()
+    except Exception:
+        pass
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_http_clients)
+
+def serve_preforked(asgi_app, host: str, port: int, workers: int, warm_up: Callable[[], None]):
+    """
+    Warms the service once, then forks `workers` uvicorn servers sharing one listening socket.
+    Children inherit the built graph and RAG indexes copy-on-write, so each becomes ready
+    immediately instead of repeating the warm-up. warm_up must not start threads or event
+    loops (everything that does so in this codebase is created lazily on first request);
+    HTTP clients built during warm-up are recreated per child (see _reset_http_clients).
+    Thread state must be shared (CHECKPOINT_BACKEND=sqlite): each child opens its own
+    checkpointer connection in the API lifespan.
+    """
+    import uvicorn
+
+    warm_up()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            server = uvicorn.Server(uvicorn.Config(asgi_app, log_level="info"))
+            server.run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    print(f"[STARTUP] Forked {workers} workers on {host}:{port}: {children}")
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+    sock.close()
@@ -0,0 +1,179 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from rag.embeddings import get_embeddings
+from tracing import tracer
+from config import (
+    TICKET_DEDUP_THRESHOLD, TICKET_DEDUP_TTL_SECONDS, TICKET_DEDUP_PENDING_TTL_SECONDS, TICKET_DEDUP_MAX_OPEN,
+    TICKET_INCIDENT_MIN_CLUSTER
+)
+
+class OpenTicketIndex:
+    """
+    Incrementally updated in-memory vector index of recently opened tickets.
+    The IT agent claims a slot before creating a ticket: if a similar open ticket exists
+    (cosine similarity >= threshold) the user is attached to it instead. Entries expire
+    TTL seconds after their last attachment, so active incidents stay open while quiet
+    ones age out. Attachment counts double as incident-detection statistics.
+    Reservations whose ticket never arrived (the creating request died) expire after
+    pending_ttl_seconds, waking anyone waiting on them.
+    """
+    def __init__(self, embeddings=None, threshold: float = TICKET_DEDUP_THRESHOLD, ttl_seconds: float = TICKET_DEDUP_TTL_SECONDS,
+                 max_open: int = TICKET_DEDUP_MAX_OPEN, pending_ttl_seconds: float = TICKET_DEDUP_PENDING_TTL_SECONDS):
+        self._embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._vectors = None  # (capacity x dim) unit vectors; rows [0, len(entries)) are live
+        self._entries: List[dict] = []
+        self.stats = {"created": 0, "attached": 0, "expired": 0, "abandoned": 0}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+
+    def embed(self, description: str) -> np.ndarray:
+        """
+        Embeds a ticket description into a unit vector (cosine = dot product).
+        """
+        with tracer.span("embedding", purpose="ticket_dedup"):
+            vector = np.asarray(self.embeddings.embed_query(description), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def claim(self, vector: np.ndarray, description: str, user: Optional[str]) -> Tuple[dict, bool]:
+        """
+        Finds a near-duplicate open ticket or reserves a new slot, atomically.
+        @param vector - Unit embedding of the description
+        @param description - Ticket text (kept for cluster statistics)
+        @param user - Requesting thread id; users are counted by distinct thread ids
+        @returns (entry, is_new). When is_new the caller must create the ticket and call complete() or release().
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if self._entries:
+                similarities = self._vectors[:len(self._entries)] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = self._entries[best]
+                    if user is not None:
+                        entry["users"].add(user)
+                    entry["requests"] += 1
+                    entry["last_seen"] = now
+                    self.stats["attached"] += 1
+                    return entry, False
+
+            entry = {
+                "ticket": None,
+                "description": description,
+                "users": {user} if user is not None else set(),
+                "requests": 1,
+                "created_at": now,
+                "last_seen": now,
+                "ready": threading.Event()
+            }
+            self._append(vector, entry)
+            return entry, True
+
+    def complete(self, entry: dict, ticket: dict):
+        """
+        Publishes the created ticket to requests that attached while it was pending.
+        """
+        entry["ticket"] = ticket
+        self.stats["created"] += 1
+        entry["ready"].set()
+
+    def release(self, entry: dict):
+        """
+        Drops a reservation whose ticket creation failed.
+        """
+        with self._lock:
+            self._remove([i for i, e in enumerate(self._entries) if e is entry])
+        entry["ready"].set()
+
+    def affected_users(self, entry: dict) -> int:
+        """
+        Distinct threads attached to an entry (at least 1: the original requester may be anonymous).
+        """
+        with self._lock:
+            return max(len(entry["users"]), 1)
+
+    def wait(self, entry: dict, timeout: float = 30.0) -> Optional[dict]:
+        """
+        Returns the ticket of an attached entry, waiting if its creation is still in flight.
+        """
+        entry["ready"].wait(timeout)
+        return entry["ticket"]
+
+    def cluster_stats(self, min_size: int = 1) -> dict:
+        """
+        Summarizes open tickets by how many users/requests attached to them.
+        Clusters with at least TICKET_INCIDENT_MIN_CLUSTER users are flagged as incident candidates.
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            open_count = len(self._entries)
+            stats = dict(self.stats)
+            clusters = []
+            for entry in self._entries:
+                if entry["ticket"] is None or len(entry["users"]) < min_size:
+                    continue
+                age_minutes = max((now - entry["created_at"]) / 60, 1 / 60)
+                clusters.append({
+                    "ticket_id": entry["ticket"]["id"],
+                    "description": entry["description"][:120],
+                    "users": len(entry["users"]),
+                    "requests": entry["requests"],
+                    "requests_per_minute": round(entry["requests"] / age_minutes, 2),
+                    "first_seen": entry["created_at"],
+                    "last_seen": entry["last_seen"],
+                    "incident_candidate": len(entry["users"]) >= TICKET_INCIDENT_MIN_CLUSTER
+                })
+        clusters.sort(key=lambda c: c["users"], reverse=True)
+        return {
+            "open_tickets": open_count,
+            "stats": stats,
+            "incident_candidates": sum(c["incident_candidate"] for c in clusters),
+            "clusters": clusters
+        }
+
+    def _append(self, vector: np.ndarray, entry: dict):
+        if len(self._entries) >= self.max_open:
+            # Full: drop the least recently active ticket
+            self._remove([min(range(len(self._entries)), key=lambda i: self._entries[i]["last_seen"])])
+        size = len(self._entries)
+        if self._vectors is None:
+            self._vectors = np.zeros((64, len(vector)), dtype=np.float32)
+        elif size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+        self._vectors[size] = vector
+        self._entries.append(entry)
+
+    def _evict(self, now: float):
+        expired = [i for i, e in enumerate(self._entries) if e["ticket"] is not None and now - e["last_seen"] > self.ttl_seconds]
+        abandoned = [i for i, e in enumerate(self._entries) if e["ticket"] is None and now - e["created_at"] > self.pending_ttl_seconds]
+        if expired:
+            self.stats["expired"] += len(expired)
+        if abandoned:
+            self.stats["abandoned"] += len(abandoned)
+            for i in abandoned:
+                self._entries[i]["ready"].set()
+        self._remove(expired + abandoned)
+
+    def _remove(self, positions: List[int]):
+        if not positions:
+            return
+        drop = set(positions)
+        keep = [i for i in range(len(self._entries)) if i not in drop]
+        self._vectors[:len(keep)] = self._vectors[keep]
+        self._entries = [self._entries[i] for i in keep]
+
+# Shared index of open tickets for the IT agent
+open_tickets = OpenTicketIndex()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from typing import List, Optional
+from fastapi import FastAPI, Header
+from pydantic import BaseModel
+from tools.ticket_tool import HTTPTicketBackend, TicketingConnector, build_ticket
+
+class TicketIn(BaseModel):
+    issue_desc: str
+    idempotency_key: Optional[str] = None
+
+class TicketBatchIn(BaseModel):
+    tickets: List[TicketIn]
+
+def create_stub_app(latency: float = 0.3) -> FastAPI:
+    """
+    Builds the stub API. Every request costs `latency` seconds, single or batch,
+    and tickets are stored by idempotency key so retries return the original ticket.
+    """
+    stub = FastAPI(title="Ticketing Stub")
+    tickets_by_key = {}
+    stub.state.stats = {"requests": 0, "tickets_created": 0}
+
+    def get_or_create(issue_desc: str, key: Optional[str]) -> dict:
+        if key and key in tickets_by_key:
+            return tickets_by_key[key]
+        ticket = build_ticket(issue_desc)
+        stub.state.stats["tickets_created"] += 1
+        if key:
+            tickets_by_key[key] = ticket
+        return ticket
+
+    @stub.post("/tickets")
+    async def create(ticket: TicketIn, idempotency_key: Optional[str] = Header(None)):
+        stub.state.stats["requests"] += 1
+        await asyncio.sleep(latency)
+        return get_or_create(ticket.issue_desc, idempotency_key or ticket.idempotency_key)
+
+    @stub.post("/tickets/batch")
+    async def create_batch(batch: TicketBatchIn):
+        stub.state.stats["requests"] += 1
+        await asyncio.sleep(latency)
+        return {"tickets": [get_or_create(t.issue_desc, t.idempotency_key) for t in batch.tickets]}
+
+    @stub.get("/stats")
+    async def stats():
+        return stub.state.stats
+
+    return stub
+
+def start_stub_server(port: int, latency: float):
+    """
+    Runs the stub in a background thread and waits until it accepts connections.
+    """
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(latency), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def run_benchmark(url: str, requests: int, concurrency: int, batch_window_ms: int, max_batch: int) -> dict:
+    """
+    Creates `requests` distinct tickets, first one at a time, then concurrently through the
+    pooled, batching connector. Returns per-ticket latency percentiles for both modes.
+    """
+    async def timed(coro):
+        started = time.perf_counter()
+        await coro
+        return time.perf_counter() - started
+
+    sequential = TicketingConnector(HTTPTicketBackend(base_url=url), batch_window_ms=0, max_batch=1)
+    seq_started = time.perf_counter()
+    seq_latencies = [await timed(sequential.acreate(f"sequential issue {i}", thread_id="bench")) for i in range(min(requests, 20))]
+    seq_elapsed = time.perf_counter() - seq_started
+    sequential.close()
+
+    batched = TicketingConnector(HTTPTicketBackend(base_url=url), batch_window_ms=batch_window_ms, max_batch=max_batch)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> float:
+        async with semaphore:
+            return await timed(batched.acreate(f"burst issue {i}", thread_id="bench"))
+
+    burst_started = time.perf_counter()
+    burst_latencies = await asyncio.gather(*[one(i) for i in range(requests)])
+    burst_elapsed = time.perf_counter() - burst_started
+    # Retry storm: same keys again must not hit the backend
+    await asyncio.gather(*[batched.acreate(f"burst issue {i}", thread_id="bench") for i in range(requests)])
+    stats = dict(batched.stats)
+    batched.close()
+
+    def summary(latencies, elapsed):
+        ordered = sorted(latencies)
+        return {
+            "tickets": len(ordered),
+            "throughput_per_sec": round(len(ordered) / elapsed, 1),
+            "p50_ms": round(statistics.median(ordered) * 1000, 1),
+            "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 1)
+        }
+
+    return {
+        "sequential": summary(seq_latencies, seq_elapsed),
+        "pooled_batched": summary(burst_latencies, burst_elapsed),
+        "connector_stats": stats
+    }
+
+def main():
+    """
+    Local stand-in for the Jira/ServiceNow REST API used by HTTPTicketBackend.
+        python -m tools.ticket_stub_server serve --port 8089 --latency 0.3
+        python -m tools.ticket_stub_server bench --requests 200 --concurrency 50
+    """
+    parser = argparse.ArgumentParser(description="Ticketing stub server and connector benchmark.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the stub API")
+    serve.add_argument("--port", type=int, default=8089)
+    serve.add_argument("--latency", type=float, default=0.3)
+
+    bench = sub.add_parser("bench", help="Benchmark TicketingConnector against an in-process stub")
+    bench.add_argument("--port", type=int, default=8089)
+    bench.add_argument("--latency", type=float, default=0.3)
+    bench.add_argument("--requests", type=int, default=200)
+    bench.add_argument("--concurrency", type=int, default=50)
+    bench.add_argument("--batch-window-ms", type=int, default=25)
+    bench.add_argument("--max-batch", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run(create_stub_app(args.latency), host="127.0.0.1", port=args.port)
+        return
+
+    server = start_stub_server(args.port, args.latency)
+    report = asyncio.run(run_benchmark(f"http://127.0.0.1:{args.port}", args.requests, args.concurrency, args.batch_window_ms, args.max_batch))
+    server.should_exit = True
+    for mode, values in report.items():
+        print(f"{mode}: {values}")
+
+if __name__ == "__main__":
+    main()
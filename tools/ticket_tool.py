@@ -1,19 +1,85 @@
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
 import random
-import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import httpx
 from langchain_core.tools import tool
+from config import (
+    TICKET_BACKEND, TICKET_API_URL, TICKET_API_TOKEN, TICKET_TIMEOUT_SECONDS, TICKET_POOL_SIZE,
+    TICKET_BATCH_WINDOW_MS, TICKET_MAX_BATCH, TICKET_SIMULATED_LATENCY
+)
 
-@tool
-def create_ticket(issue_desc: str):
+def idempotency_key(issue_desc: str, thread_id: Optional[str] = None) -> str:
+    """
+    Derives a stable key from the thread and the (normalized) query.
+    A retried or resumed graph produces the same key and therefore the same ticket.
+    """
+    normalized = " ".join(issue_desc.lower().split())
+    return hashlib.sha256(f"{thread_id or ''}\x1f{normalized}".encode("utf-8")).hexdigest()[:32]
+
+class TicketBackend(ABC):
+    """
+    Interface for ticketing systems (Jira, ServiceNow, ...).
+    Backends receive already-coalesced batches; single creates are batches of one.
+    """
+    @abstractmethod
+    async def create_many(self, requests: List[dict]) -> List[dict]:
+        ...
+
+    async def close(self):
+        pass
+
+class SimulatedTicketBackend(TicketBackend):
+    """
+    In-process simulation of Jira/ServiceNow.
+    Enterprise Ready: Includes mock latency (per round trip, like a real batch API) and structured metadata.
+    """
+    def __init__(self, latency: float = TICKET_SIMULATED_LATENCY):
+        self.latency = latency
+
+    async def create_many(self, requests: List[dict]) -> List[dict]:
+        await asyncio.sleep(self.latency)
+        return [build_ticket(r["issue_desc"]) for r in requests]
+
+class HTTPTicketBackend(TicketBackend):
     """
-    Simulates a connection to Jira/ServiceNow to create a support ticket.
-    Enterprise Ready: Includes mock latency and structured metadata.
+    Talks to a ticketing REST API over a pooled keep-alive HTTP client.
+    Sends the idempotency key with every ticket so the server can deduplicate across restarts.
     """
-    # 🧪 Enterprise Simulation: Real APIs have latency
-    time.sleep(1.2) 
-    
+    def __init__(self, base_url: str = TICKET_API_URL, token: str = TICKET_API_TOKEN, timeout: float = TICKET_TIMEOUT_SECONDS, pool_size: int = TICKET_POOL_SIZE):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def create_many(self, requests: List[dict]) -> List[dict]:
+        if len(requests) == 1:
+            r = requests[0]
+            res = await self.client.post(
+                "/tickets",
+                json={"issue_desc": r["issue_desc"]},
+                headers={"Idempotency-Key": r["idempotency_key"]}
+            )
+            res.raise_for_status()
+            return [res.json()]
+
+        res = await self.client.post("/tickets/batch", json={"tickets": requests})
+        res.raise_for_status()
+        return res.json()["tickets"]
+
+    async def close(self):
+        await self.client.aclose()
+
+def build_ticket(issue_desc: str) -> dict:
     prefixes = ["JIRA", "SNOW", "SVC"]
     ticket_id = f"{random.choice(prefixes)}-{random.randint(1000, 9999)}"
-    
+
     return {
         "id": ticket_id,
         "status": "QUEUED",
@@ -21,3 +87,134 @@ def create_ticket(issue_desc: str):
         "cluster_node": "AWS-US-EAST-1",
         "description": issue_desc[:50] + "..."
     }
+
+def get_ticket_backend(kind: str = TICKET_BACKEND) -> TicketBackend:
+    """
+    Returns the configured ticketing backend ("http" or the default simulation).
+    """
+    if kind == "http":
+        return HTTPTicketBackend()
+    return SimulatedTicketBackend()
+
+class TicketingConnector:
+    """
+    Async ticket creation shared by sync and async graph nodes.
+    - Owns a dedicated event loop thread, so one pooled backend serves every caller.
+    - Coalesces creates arriving within TICKET_BATCH_WINDOW_MS into one backend call.
+    - Deduplicates by idempotency key (in-flight and recently created tickets).
+    """
+    def __init__(self, backend: Optional[TicketBackend] = None, batch_window_ms: int = TICKET_BATCH_WINDOW_MS, max_batch: int = TICKET_MAX_BATCH, max_remembered: int = 10000):
+        self._backend = backend
+        self._owns_backend = backend is None
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.max_remembered = max_remembered
+        self._loop = None
+        self._start_lock = threading.Lock()
+        self._pending = []
+        self._flush_handle = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._created = OrderedDict()
+        self.stats = {"requests": 0, "deduplicated": 0, "backend_calls": 0}
+
+    def create(self, issue_desc: str, thread_id: Optional[str] = None, timeout: float = TICKET_TIMEOUT_SECONDS * 3) -> dict:
+        """
+        Blocking create for synchronous callers.
+        """
+        return self._schedule(issue_desc, thread_id).result(timeout=timeout)
+
+    async def acreate(self, issue_desc: str, thread_id: Optional[str] = None) -> dict:
+        """
+        Non-blocking create for async callers on any event loop.
+        """
+        return await asyncio.wrap_future(self._schedule(issue_desc, thread_id))
+
+    def close(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.backend.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+        if self._owns_backend:
+            self._backend = None
+
+    @property
+    def backend(self) -> TicketBackend:
+        if self._backend is None:
+            self._backend = get_ticket_backend()
+        return self._backend
+
+    def _schedule(self, issue_desc: str, thread_id: Optional[str]):
+        request = {"issue_desc": issue_desc, "idempotency_key": idempotency_key(issue_desc, thread_id)}
+        return asyncio.run_coroutine_threadsafe(self._submit(request), self._ensure_loop())
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ticketing-connector", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _submit(self, request: dict) -> dict:
+        # Runs on the connector loop: no locking needed for the structures below
+        self.stats["requests"] += 1
+        key = request["idempotency_key"]
+        if key in self._created:
+            self.stats["deduplicated"] += 1
+            return self._created[key]
+        if key in self._inflight:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = self._loop.create_future()
+        self._inflight[key] = future
+        self._pending.append((request, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.batch_window, self._flush_now)
+        return await asyncio.shield(future)
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._loop.create_task(self._send(batch))
+
+    async def _send(self, batch: list):
+        self.stats["backend_calls"] += 1
+        try:
+            tickets = await self.backend.create_many([request for request, _ in batch])
+            if len(tickets) != len(batch):
+                raise ValueError(f"backend returned {len(tickets)} tickets for {len(batch)} requests")
+            for (request, future), ticket in zip(batch, tickets):
+                self._remember(request["idempotency_key"], ticket)
+                future.set_result(ticket)
+        except Exception as e:
+            print(f"[TICKET] Backend call failed for {len(batch)} tickets: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for request, _ in batch:
+                self._inflight.pop(request["idempotency_key"], None)
+
+    def _remember(self, key: str, ticket: dict):
+        self._created[key] = ticket
+        while len(self._created) > self.max_remembered:
+            self._created.popitem(last=False)
+
+# Shared connector: one pool and one dedup window per process
+ticket_connector = TicketingConnector()
+
+@tool
+def create_ticket(issue_desc: str, thread_id: Optional[str] = None):
+    """
+    Creates a support ticket in Jira/ServiceNow through the shared ticketing connector.
+    Repeated calls for the same thread and issue return the same ticket.
+    """
+    return ticket_connector.create(issue_desc, thread_id=thread_id)
@@ -0,0 +1,121 @@
+from tracing import TRACE_FILE
+from config import TRACE_DIR
+from collections import defaultdict
+import argparse
+import glob
+import json
+import os
+
+def load_spans(directory: str, trace_id: str = None) -> list:
+    """
+    Reads spans from the rotated JSONL sink (oldest file first).
+    """
+    base = os.path.join(directory, TRACE_FILE)
+    files = sorted(glob.glob(f"{base}.*"), key=lambda f: int(f.rsplit(".", 1)[1]), reverse=True)
+    if os.path.exists(base):
+        files.append(base)
+
+    spans = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if trace_id is None or span["traceId"].startswith(trace_id):
+                    spans.append(span)
+    return spans
+
+def duration_ms(span: dict) -> float:
+    return (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+
+def critical_path(span: dict, children: dict) -> list:
+    """
+    Walks backwards from the end of a span: the child that finishes last is on the
+    critical path, then the latest child finishing before that one started, and so on.
+    """
+    path = [span]
+    cursor = span["endTimeUnixNano"]
+    chain = []
+    for child in sorted(children[span["spanId"]], key=lambda c: c["endTimeUnixNano"], reverse=True):
+        if child["endTimeUnixNano"] <= cursor:
+            chain.append(child)
+            cursor = child["startTimeUnixNano"]
+    for child in reversed(chain):
+        path.extend(critical_path(child, children))
+    return path
+
+def render_trace(spans: list):
+    children = defaultdict(list)
+    by_id = {s["spanId"]: s for s in spans}
+    roots = []
+    for s in spans:
+        if s["parentSpanId"] and s["parentSpanId"] in by_id:
+            children[s["parentSpanId"]].append(s)
+        else:
+            roots.append(s)
+
+    root = min(roots, key=lambda s: s["startTimeUnixNano"])
+    on_path = {s["spanId"] for s in critical_path(root, children)}
+    origin = root["startTimeUnixNano"]
+
+    print(f"Trace {root['traceId']}  {root['name']}  {duration_ms(root):.1f} ms  {root['attributes']}")
+    print(f"{'':2}{'offset':>9} {'duration':>10}  span   (* = critical path)")
+
+    def walk(span: dict, depth: int):
+        marker = "*" if span["spanId"] in on_path else " "
+        offset = (span["startTimeUnixNano"] - origin) / 1e6
+        status = "" if span["status"]["code"] == "OK" else f"  !! {span['status'].get('message', '')}"
+        attrs = {k: v for k, v in span["attributes"].items() if v not in ("", 0)}
+        print(f"{marker} {offset:>8.1f} {duration_ms(span):>9.1f}ms  {'  ' * depth}{span['name']} {attrs if attrs else ''}{status}")
+        for child in sorted(children[span["spanId"]], key=lambda c: c["startTimeUnixNano"]):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+
+    # Self time along the critical path shows where the wall-clock time actually went
+    print("\nCritical path self time:")
+    path = [by_id[i] for i in on_path]
+    totals = defaultdict(float)
+    for span in path:
+        on_path_children = sum(duration_ms(c) for c in children[span["spanId"]] if c["spanId"] in on_path)
+        totals[span["name"]] += max(duration_ms(span) - on_path_children, 0.0)
+    for name, ms in sorted(totals.items(), key=lambda x: x[1], reverse=True):
+        print(f"  {name:<28} {ms:>9.1f} ms  ({ms / max(duration_ms(root), 1e-9):.0%})")
+
+def list_traces(spans: list, limit: int):
+    roots = [s for s in spans if not s["parentSpanId"]]
+    roots.sort(key=duration_ms, reverse=True)
+    print(f"{'trace_id':<34} {'duration':>10}  {'name':<8} status  attributes")
+    for root in roots[:limit]:
+        print(f"{root['traceId']:<34} {duration_ms(root):>8.1f}ms  {root['name']:<8} {root['status']['code']:<6}  {root['attributes']}")
+
+def main():
+    """
+    Renders traces exported by tracing.py, e.g.:
+        python trace_report.py                 # slowest traces
+        python trace_report.py 3f2a9c          # span tree + critical path of one trace (id prefix)
+    """
+    parser = argparse.ArgumentParser(description="Inspect request traces and their critical path.")
+    parser.add_argument("trace_id", nargs="?", help="Trace id (or unique prefix) to render")
+    parser.add_argument("--dir", default=TRACE_DIR, help="Trace sink directory")
+    parser.add_argument("--limit", type=int, default=20, help="Number of traces to list")
+    args = parser.parse_args()
+
+    spans = load_spans(args.dir, args.trace_id)
+    if not spans:
+        print(f"No spans found in {args.dir}")
+        return
+    if args.trace_id is None:
+        list_traces(spans, args.limit)
+        return
+
+    trace_ids = {s["traceId"] for s in spans}
+    if len(trace_ids) > 1:
+        print(f"Prefix '{args.trace_id}' matches {len(trace_ids)} traces; use a longer prefix.")
+        return
+    render_trace(spans)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import var_child_runnable_config
+from config import (
+    TRACE_ENABLED, TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_DIR,
+    TRACE_MAX_BYTES, TRACE_BACKUP_COUNT, TRACE_QUEUE_SIZE
+)
+
+TRACE_FILE = "traces.jsonl"
+
+class Span:
+    """
+    One timed operation inside a trace. Serialized in OTLP/JSON field naming.
+    """
+    def __init__(self, trace: "Trace", name: str, kind: str, parent_id: Optional[str], attributes: Optional[dict] = None):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+            self.trace.has_error = True
+        self.trace.spans.append(self)
+
+    def to_record(self) -> dict:
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": {k: v if isinstance(v, (str, int, float, bool)) else str(v) for k, v in self.attributes.items()},
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"}
+        }
+
+class Trace:
+    """
+    All spans of one request. Spans are buffered until finish(), which applies the
+    sampling decision: head-sampled traces are kept, and so are errors and slow requests.
+    """
+    def __init__(self, tracer: "Tracer", name: str, attributes: Optional[dict] = None):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.sampled = random.random() < tracer.sample_rate
+        self.has_error = False
+        self.spans: List[Span] = []
+        self.root = Span(self, name, "server", None, attributes)
+        self.handler = TracingCallbackHandler(self)
+        self._token = None
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.root.end(error)
+        duration_ms = (self.root.end_ns - self.root.start_ns) / 1e6
+        if self.sampled or self.has_error or duration_ms >= self.tracer.slow_ms:
+            self.tracer.exporter.export([s.to_record() for s in self.spans])
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain/LangGraph callbacks into spans: graph nodes, LLM calls and tool calls.
+    Run ids are mapped to spans so nested runs (and explicit spans) find their parent.
+    """
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self.spans: Dict[UUID, Span] = {}
+        self.pass_through: Dict[UUID, str] = {}  # Non-span runs (routers, channel writes) -> inherited parent span id
+
+    def parent_span_id(self, parent_run_id: Optional[UUID]) -> str:
+        if parent_run_id in self.spans:
+            return self.spans[parent_run_id].span_id
+        return self.pass_through.get(parent_run_id, self.trace.root.span_id)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str, **attributes):
+        self.spans[run_id] = Span(self.trace, name, kind, self.parent_span_id(parent_run_id), attributes)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes):
+        self.pass_through.pop(run_id, None)
+        span = self.spans.pop(run_id, None)
+        if span:
+            span.attributes.update(attributes)
+            span.end(error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        run_name = name or (serialized or {}).get("name", "chain")
+        if node and node == run_name:
+            self._start(run_id, parent_run_id, f"node.{node}", "internal")
+        elif run_name == "LangGraph":
+            self._start(run_id, parent_run_id, "graph", "internal")
+        else:
+            self.pass_through[run_id] = self.parent_span_id(parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, invocation_params=None, **kwargs):
+        params = invocation_params or {}
+        self._start(run_id, parent_run_id, "llm", "client", model=params.get("model") or params.get("model_name") or params.get("_type", ""))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm", "client")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._end(run_id, total_tokens=usage.get("total_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, f"tool.{(serialized or {}).get('name', 'tool')}", "client")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+class SpanExporter:
+    """
+    Asynchronous span sink: a bounded queue drained by a daemon thread into
+    size-rotated JSONL files (traces.jsonl, traces.jsonl.1, ...). Never blocks requests;
+    spans are dropped (and counted) when the queue is full.
+    """
+    def __init__(self, directory: str = TRACE_DIR, max_bytes: int = TRACE_MAX_BYTES, backup_count: int = TRACE_BACKUP_COUNT, queue_size: int = TRACE_QUEUE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, records: List[dict]):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(records)
+        except queue.Full:
+            self.dropped += len(records)
+
+    def flush(self, timeout: float = 5.0):
+        """
+        Waits until everything queued so far is on disk (used by tests and CLIs).
+        """
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        done.wait(timeout)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, TRACE_FILE)
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Drain whatever else is waiting to amortize file writes
+            while not self._queue.empty() and len(batch) < 256:
+                batch.append(self._queue.get_nowait())
+            try:
+                lines = "".join(json.dumps(r) + "\n" for records in batch if isinstance(records, list) for r in records)
+                if lines:
+                    self._rotate_if_needed(path)
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write(lines)
+            except Exception as e:
+                print(f"[TRACE] Export failed: {e}")
+            for records in batch:
+                if isinstance(records, threading.Event):
+                    records.set()
+
+    def _rotate_if_needed(self, path: str):
+        if not os.path.exists(path) or os.path.getsize(path) < self.max_bytes:
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Entry point for request tracing.
+    - start_trace()/finish_trace() bracket one request and bind it to the current context.
+    - span() records explicit operations (embedding, FAISS search, audit write, ...).
+    - callbacks() returns the LangChain handler to pass in the graph run config.
+    Everything is a no-op when TRACE_ENABLED is false or no trace is active.
+    """
+    def __init__(self, enabled: bool = TRACE_ENABLED, sample_rate: float = TRACE_SAMPLE_RATE, slow_ms: float = TRACE_SLOW_MS):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exporter = SpanExporter()
+
+    def start_trace(self, name: str, **attributes) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        trace = Trace(self, name, attributes)
+        trace._token = _current_trace.set(trace)
+        return trace
+
+    def finish_trace(self, trace: Optional[Trace], error: Optional[BaseException] = None):
+        if trace is None:
+            return
+        trace.finish(error)
+        try:
+            _current_trace.reset(trace._token)
+        except ValueError:
+            # Finished from a different context (e.g. generator cleanup); nothing to restore
+            pass
+
+    def callbacks(self, trace: Optional[Trace]) -> list:
+        return [trace.handler] if trace else []
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes):
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        span = Span(trace, name, kind, self._parent_id(trace), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    @staticmethod
+    def _parent_id(trace: Trace) -> str:
+        explicit = _current_span.get()
+        if explicit is not None and explicit.trace is trace:
+            return explicit.span_id
+        # Inside a LangChain run: parent is the node/LLM span of the enclosing run
+        config = var_child_runnable_config.get() or {}
+        parent_run_id = getattr(config.get("callbacks"), "parent_run_id", None)
+        return trace.handler.parent_span_id(parent_run_id)
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+# Process-wide tracer
+tracer = Tracer()